@@ -0,0 +1,17 @@
+"""
+Arquivos estáticos do dashboard (logo, vídeo, textos), lidos do disco uma vez por
+processo e servidos da memória nas execuções seguintes do script.
+"""
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
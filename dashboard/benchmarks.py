@@ -0,0 +1,226 @@
+"""
+Benchmarks das rotinas de processamento de dados do dashboard.
+
+Cada benchmark também confere o resultado contra a implementação de referência.
+
+Uso: python dashboard/benchmarks.py [nome ...]
+"""
+import datetime
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import calibration
+import cfr
+import cube
+import ensemble
+import episem
+import excess
+import rt
+import seqiahr
+
+SEQIAHR_PARAMS = {
+    'chi': .76, 'phi': .005, 'beta': .6, 'rho': .12, 'delta': .1, 'gamma': .05,
+    'alpha': .37, 'mu': .01, 'p': .63, 'q': 35, 'r': 80,
+}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_episem(start="1950-01-01", end="2049-12-31"):
+    """
+    episem_array contra episem escalar sobre décadas de datas diárias.
+    """
+    dates = pd.date_range(start, end, freq="D")
+    (epiyear, epiweek), vectorized = timed(episem.episem_array, dates)
+    reference, scalar = timed(lambda: [episem.episem(d, out="YW") for d in dates.to_pydatetime()])
+    expected = np.array([[int(r[:4]), int(r[5:])] for r in reference])
+    assert (epiyear == expected[:, 0]).all() and (epiweek == expected[:, 1]).all()
+    return {"dates": len(dates), "scalar_s": scalar, "vectorized_s": vectorized}
+
+
+def bench_seqiahr(n_scenarios=100):
+    """
+    Integração em lote contra uma chamada do epimodels por cenário.
+    """
+    values = list(np.linspace(1, 165, n_scenarios))
+    params = seqiahr.scenarios(SEQIAHR_PARAMS, "q", values)
+    (times, states), batched = timed(seqiahr.simulate, params)
+    result = {"scenarios": n_scenarios, "batched_s": batched}
+    try:
+        from epimodels.continuous.models import SEQIAHR
+    except ImportError:
+        return result
+
+    def run_epimodels():
+        traces = []
+        for p in params:
+            model = SEQIAHR()
+            model(inits=seqiahr.INITS, trange=seqiahr.TRANGE, totpop=1, params=dict(p),
+                  t_eval=range(*seqiahr.TRANGE))
+            traces.append(np.column_stack([model.traces[v] for v in seqiahr.STATE_VARIABLES]))
+        return np.stack(traces)
+
+    reference, serial = timed(run_epimodels)
+    result.update({"epimodels_s": serial, "max_abs_diff": float(np.abs(states - reference).max())})
+    return result
+
+
+def bench_ensemble(n_draws=400):
+    """
+    Quantis por histograma do ensemble contra os percentis exatos das trajetórias.
+    """
+    names = ["beta", "chi", "phi", "mu", "p"]
+    (times, bands), elapsed = timed(ensemble.run_ensemble, SEQIAHR_PARAMS, .1, names, n_draws, seed=1)
+    _, states = seqiahr.simulate(ensemble.draw_parameters(SEQIAHR_PARAMS, .1, names, n_draws, seed=1))
+    exact = np.percentile(states, ensemble.QUANTILES, axis=0)
+    visible = exact > 1e-8
+    error = np.abs(bands - exact)[visible] / exact[visible]
+    return {"draws": n_draws, "ensemble_s": elapsed, "median_rel_err": float(np.median(error)),
+            "max_rel_err": float(error.max())}
+
+
+def bench_calibration(n_regions=27, n_days=120, seed=0):
+    """
+    Ajuste de `n_regions` séries sintéticas em paralelo, a frio e a partir do ajuste
+    anterior (warm start), com o erro relativo dos parâmetros recuperados.
+    """
+    rng = np.random.RandomState(seed)
+    names = calibration.FIT_PARAMETERS
+    truths, series = {}, {}
+    for region in range(n_regions):
+        truth = dict(SEQIAHR_PARAMS, **{name: SEQIAHR_PARAMS[name] * rng.uniform(.7, 1.3) for name in names})
+        _, states = seqiahr.simulate(truth)
+        cases, deaths = states[0, :, 6] * 1e7, states[0, :, 7] * 1e7
+        days = np.arange(n_days)
+        first = int(np.argmax(cases >= 1))
+        truths[region] = truth
+        series[region] = (days, np.round(cases[first + days]), np.round(deaths[first + days]))
+    cold, cold_s = timed(calibration.fit_regions, series, 1e7, SEQIAHR_PARAMS)
+    warm, warm_s = timed(calibration.fit_regions, series, 1e7, SEQIAHR_PARAMS, previous=cold)
+    error = [abs(warm[r]["params"][name] / truths[r][name] - 1) for r in series for name in names]
+    return {"regions": n_regions, "cold_s": cold_s, "warm_s": warm_s,
+            "median_param_rel_err": float(np.median(error)),
+            "max_loss": max(fit["loss"] for fit in warm.values()),
+            "warm_iterations": float(np.mean([fit["iterations"] for fit in warm.values()]))}
+
+
+def bench_rt(n_regions=5570, n_days=250, seed=0):
+    """
+    Rt em lote para `n_regions` séries sintéticas contra um laço por região e por dia
+    (implementação direta de Cori et al.) em parte das regiões.
+    """
+    rng = np.random.RandomState(seed)
+    growth = rng.uniform(-.03, .06, n_regions)
+    expected = rng.uniform(.5, 20, n_regions) * np.exp(np.outer(np.arange(n_days), growth))
+    incidence = rng.poisson(np.minimum(expected, 1e5)).astype(float)
+    incidence[:, :n_regions // 10] = np.nan  # regiões sem dados
+    w = rt.serial_interval()
+    result, batched = timed(rt.estimate, incidence, w)
+
+    def reference(series):
+        out = np.full((len(series), 3), np.nan)
+        for t in range(rt.WINDOW, len(series)):
+            cases, infectious = 0., 0.
+            for day in range(t - rt.WINDOW + 1, t + 1):
+                cases += series[day]
+                infectious += sum(w[s - 1] * series[day - s] for s in range(1, min(len(w), day) + 1))
+            if cases >= rt.MIN_CASES and infectious > 0:
+                shape = rt.PRIOR_SHAPE + cases
+                scale = 1 / (1 / rt.PRIOR_SCALE + infectious)
+                out[t] = [shape * scale] + [stats.gamma.ppf(q, shape, scale=scale) for q in rt.QUANTILES]
+        return out
+
+    sample = np.arange(n_regions // 10, n_regions, n_regions // 20)
+    expected, serial = timed(lambda: [reference(incidence[:, r]) for r in sample])
+    diff = np.nanmax(np.abs(np.stack(expected, axis=1) - result[:, sample]))
+    return {"regions": n_regions, "days": n_days, "batched_s": batched,
+            "loop_s_per_region": serial / len(sample), "max_abs_diff": float(diff)}
+
+
+def bench_map():
+    """
+    Tamanho (bytes de JSON) e tempo de montagem dos dados enviados ao pydeck pelo
+    mapa dos estados, o único nível do mapa. Deve ser executado da raiz do repositório.
+    """
+    estados = pd.read_csv("mapas/Estados.csv").assign(casos=0, mortes=0)
+    records, elapsed = timed(lambda: json.dumps(estados.to_dict(orient="records")))
+    return {"estados": {"features": len(estados), "bytes": len(records), "s": elapsed}}
+
+
+def synthetic_cases(n_cities=5570, start="2020-02-25", end="2020-10-31", seed=0):
+    """
+    Tabela no formato do caso_full (linhas municipais) com séries acumuladas sintéticas.
+    """
+    rng = np.random.RandomState(seed)
+    dates = pd.date_range(start, end)
+    first = rng.randint(0, len(dates), n_cities)
+    lengths = len(dates) - first
+    city = np.repeat(np.arange(n_cities), lengths)
+    day = np.concatenate([np.arange(f, len(dates)) for f in first])
+    cases = np.concatenate([np.cumsum(rng.poisson(3, n)) + 1 for n in lengths])
+    deaths = np.concatenate([np.cumsum(rng.poisson(.1, n)) for n in lengths])
+    return pd.DataFrame({
+        "date": dates[day],
+        "state": pd.Categorical(np.array(sorted(excess.STATES))[city % 27]),
+        "city": pd.Categorical([f"Cidade {c}" for c in city]),
+        "place_type": pd.Categorical(["city"] * len(city)),
+        "Casos Confirmados": cases,
+        "Mortes Acumuladas": deaths,
+    })
+
+
+def bench_cfr(n_cities=5570):
+    """
+    Gráfico de letalidade por estado: versão anterior (groupby, datas em Python e
+    px.scatter SVG a cada visita) contra tabela por snapshot e Scattergl. O tempo
+    até o primeiro desenho é aproximado pela montagem e serialização da figura.
+    """
+    import plotly.express as px
+    data = synthetic_cases(n_cities)
+
+    def legacy():
+        df_states = data[data.place_type != 'state'].groupby(['date', 'state'])[
+            ['Casos Confirmados', 'Mortes Acumuladas']].sum()
+        df_states.reset_index(inplace=True)
+        df_states.set_index('date', inplace=True)
+        df_states['Mortalidade'] = df_states['Mortes Acumuladas'] / df_states['Casos Confirmados']
+        df_states['data'] = [x.date() for x in df_states.index]
+        fig = px.scatter(df_states[df_states.data > datetime.date(2020, 3, 15)], x="Casos Confirmados",
+                         y="Mortalidade", size="Mortes Acumuladas", color="state", opacity=0.6,
+                         hover_name="data", log_x=True, log_y=False, size_max=60)
+        return fig.to_json()
+
+    data_cube = cube.build_cube(data)
+    before, before_s = timed(legacy)
+    table, table_s = timed(cfr.cfr_table, data_cube)
+    figure, figure_s = timed(cfr.cfr_figure, table)
+    payload, cached_s = timed(figure.to_json)
+    animated, animated_s = timed(lambda: cfr.cfr_figure(table, animate=True).to_json())
+    return {"before_s": before_s, "before_bytes": len(before),
+            "first_render_s": table_s + figure_s + cached_s, "cached_render_s": cached_s,
+            "after_bytes": len(payload), "animated_s": animated_s, "animated_bytes": len(animated)}
+
+
+BENCHMARKS = {
+    "episem": bench_episem,
+    "seqiahr": bench_seqiahr,
+    "ensemble": bench_ensemble,
+    "calibration": bench_calibration,
+    "rt": bench_rt,
+    "map": bench_map,
+    "cfr": bench_cfr,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        print(name, BENCHMARKS[name]())
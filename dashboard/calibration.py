@@ -0,0 +1,163 @@
+"""
+Calibração do SEQIAHR contra as séries de casos e mortes do brasil.io.
+
+Ajusta um subconjunto dos parâmetros e o atraso no início da notificação de modo que
+as Hospitalizações e Mortes Acumuladas simuladas acompanhem os Casos Confirmados e as
+Mortes Acumuladas oficiais, como na comparação de `plot_predictions`. A busca é um
+método de entropia cruzada: a cada iteração um lote de candidatos é sorteado em torno
+da melhor estimativa e integrado de uma vez (seqiahr.simulate), repartido entre os
+processos do pool do ensemble. Para cada candidato o melhor atraso é escolhido por
+varredura direta sobre as trajetórias diárias.
+
+O custo é limitado: `iterations × batch_size` integrações por região.
+"""
+import numpy as np
+
+import ensemble
+import seqiahr
+
+FIT_PARAMETERS = ["beta", "chi", "phi", "mu"]
+# Valores iniciais dos sliders, ponto de partida quando não há ajuste anterior
+START = {"beta": .6, "chi": .76, "phi": .005, "mu": .01}
+# Mesmas faixas dos sliders da página de modelos
+BOUNDS = {
+    "chi": (0., 1.), "phi": (0., .5), "beta": (0., 1.), "rho": (0., 1.), "delta": (0., 1.),
+    "gamma": (0., 1.), "alpha": (0., 10.), "mu": (0., 1.), "p": (0., 1.),
+}
+MAX_OFFSET = 90
+ITERATIONS = 15
+# Desvio inicial dos sorteios, em frações da faixa de cada parâmetro
+COLD_SPREAD = .15
+WARM_SPREAD = .05
+
+
+def observed_series(data, start_column="Casos Confirmados"):
+    """
+    Séries diárias a partir do primeiro caso, no formato longo de `get_data_uf` (uma
+    única região).
+
+    :return: (first_date, days, cases, deaths), com `days` os dias desde o primeiro
+        caso em que há dados
+    """
+    data = data[data[start_column] > 0].sort_values("date")
+    first_date = data["date"].iloc[0]
+    days = ((data["date"] - first_date).dt.days).to_numpy()
+    cases = data["Casos Confirmados"].to_numpy(float)
+    deaths = np.nan_to_num(data["Mortes Acumuladas"].to_numpy(float))
+    return first_date, days, cases, deaths
+
+
+def trajectory_loss(states, days, cases, deaths, N, max_offset=MAX_OFFSET):
+    """
+    Erro quadrático em escala log entre trajetórias e dados para cada atraso.
+
+    :param states: array (candidatos, dias, 8) de seqiahr.simulate
+    :return: (losses, offsets) com a menor perda de cada candidato e o atraso
+        correspondente
+    """
+    C = np.log1p(states[:, :, seqiahr.STATE_VARIABLES.index("C")] * N)
+    D = np.log1p(states[:, :, seqiahr.STATE_VARIABLES.index("D")] * N)
+    log_cases = np.log1p(cases)
+    log_deaths = np.log1p(deaths)
+    n_offsets = min(max_offset, states.shape[1] - 1 - days[-1]) + 1
+    losses = np.empty((states.shape[0], n_offsets))
+    for offset in range(n_offsets):
+        index = days + offset
+        losses[:, offset] = ((C[:, index] - log_cases) ** 2).mean(axis=1) + \
+            ((D[:, index] - log_deaths) ** 2).mean(axis=1)
+    offsets = losses.argmin(axis=1)
+    return losses[np.arange(len(offsets)), offsets], offsets
+
+
+def _evaluate(P, days, cases, deaths, N, trange, max_offset):
+    _, states = seqiahr.simulate(P, trange=trange)
+    return trajectory_loss(states, days, cases, deaths, N, max_offset)
+
+
+def evaluate(P, days, cases, deaths, N, trange, max_offset=MAX_OFFSET, pool=None, chunks=1):
+    """
+    Perda e atraso de cada linha de P, repartindo o lote entre `chunks` tarefas do pool.
+    """
+    if pool is None or chunks <= 1:
+        return _evaluate(P, days, cases, deaths, N, trange, max_offset)
+    futures = [pool.submit(_evaluate, part, days, cases, deaths, N, trange, max_offset)
+               for part in np.array_split(P, chunks)]
+    results = [future.result() for future in futures]
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def iter_fit(days, cases, deaths, N, params, names=FIT_PARAMETERS, warm=False, iterations=ITERATIONS,
+             batch_size=64, n_elite=8, max_offset=MAX_OFFSET, tol=5e-3, seed=0, pool=None, chunks=1):
+    """
+    Ajusta os parâmetros `names` e o atraso às séries observadas, produzindo o
+    melhor resultado até o momento ao fim de cada iteração, para que o progresso
+    possa ser exibido enquanto o ajuste roda.
+
+    :param params: ponto de partida (dict com todos os PARAMETERS); com `warm=True`
+        é tratado como um ajuste anterior e a busca começa mais concentrada
+    :param tol: a busca para antes de `iterations` quando o desvio dos sorteios fica
+        abaixo de `tol` (em frações da faixa) em todos os parâmetros
+    :return: gerador de dicts com `params` (ajustados), `offset`, `loss` e
+        `iterations` (concluídas)
+    """
+    rng = np.random.RandomState(seed)
+    columns = [seqiahr.PARAMETERS.index(name) for name in names]
+    low = np.array([BOUNDS[name][0] for name in names])
+    high = np.array([BOUNDS[name][1] for name in names])
+    base = seqiahr.param_matrix(params)[0]
+    trange = [0, max(seqiahr.TRANGE[1], int(days[-1]) + max_offset + 1)]
+
+    mean = (base[columns] - low) / (high - low)
+    std = np.full(len(names), WARM_SPREAD if warm else COLD_SPREAD)
+    best = (np.inf, 0, mean)
+    for iteration in range(iterations):
+        scaled = np.clip(mean + std * rng.randn(batch_size, len(names)), 0, 1)
+        scaled[0] = best[2]  # a melhor estimativa sempre volta ao lote
+        P = np.repeat(base[np.newaxis], batch_size, axis=0)
+        P[:, columns] = low + scaled * (high - low)
+        losses, offsets = evaluate(P, days, cases, deaths, N, trange, max_offset, pool, chunks)
+        losses = np.where(np.isfinite(losses), losses, np.inf)
+        elite = np.argsort(losses)[:n_elite]
+        if losses[elite[0]] < best[0]:
+            best = (losses[elite[0]], int(offsets[elite[0]]), scaled[elite[0]])
+        mean = scaled[elite].mean(axis=0)
+        std = scaled[elite].std(axis=0)
+
+        fitted = dict(params)
+        for name, value in zip(names, low + best[2] * (high - low)):
+            fitted[name] = float(value)
+        yield {"params": fitted, "offset": best[1], "loss": float(best[0]), "iterations": iteration + 1}
+        if std.max() < tol:
+            break
+
+
+def fit(days, cases, deaths, N, params, **kwargs):
+    """
+    Resultado final de `iter_fit`.
+    """
+    for result in iter_fit(days, cases, deaths, N, params, **kwargs):
+        pass
+    return result
+
+
+def _fit_region(region, series, N, params, warm, kwargs):
+    return region, fit(*series, N, params, warm=warm, **kwargs)
+
+
+def fit_regions(series, N, params, previous=None, **kwargs):
+    """
+    Ajusta várias regiões em paralelo, uma tarefa do pool por região.
+
+    :param series: dict região -> (days, cases, deaths)
+    :param N: população em risco, um valor ou dict por região
+    :param previous: dict região -> ajuste anterior, usado como partida (warm start)
+    :return: dict região -> resultado de `fit`
+    """
+    previous = previous or {}
+    pool = ensemble.get_pool()
+    futures = []
+    for region, s in series.items():
+        n = N[region] if isinstance(N, dict) else N
+        start = previous[region]["params"] if region in previous else params
+        futures.append(pool.submit(_fit_region, region, s, n, start, region in previous, kwargs))
+    return dict(future.result() for future in futures)
@@ -0,0 +1,98 @@
+"""
+Letalidade (mortes / casos confirmados) diária por estado.
+
+A tabela é montada uma vez por snapshot a partir do cubo de agregação, somando os
+municípios de cada estado, e o gráfico usa traços WebGL (Scattergl), um por estado,
+ou uma animação por data com um único traço por quadro.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+START = datetime.date(2020, 3, 15)
+SIZE_MAX = 60
+
+
+def cfr_table(data_cube, start=START):
+    """
+    :return: DataFrame (date, data, state, Casos Confirmados, Mortes Acumuladas,
+        Mortalidade) ordenado por (state, date), só com datas posteriores a `start`
+    """
+    totals, present = data_cube.city_totals_by_state(["Casos Confirmados", "Mortes Acumuladas"])
+    states = data_cube.city_states
+    after = data_cube.dates > pd.Timestamp(start)
+    state, date = np.nonzero(present.T & after)
+    cases = totals[date, state, 0].astype(np.int64)
+    deaths = totals[date, state, 1].astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mortality = deaths / cases
+    mortality[~np.isfinite(mortality)] = np.nan
+    return pd.DataFrame({
+        "date": data_cube.dates[date],
+        "data": np.asarray(data_cube.dates.strftime("%Y-%m-%d"))[date],
+        "state": np.asarray(states, dtype=object)[state],
+        "Casos Confirmados": cases,
+        "Mortes Acumuladas": deaths,
+        "Mortalidade": mortality,
+    })
+
+
+def _marker(deaths, sizeref, color):
+    return dict(size=deaths, sizemode="area", sizeref=sizeref, sizemin=1, color=color, opacity=.6)
+
+
+def cfr_figure(table, animate=False):
+    """
+    Letalidade contra casos confirmados (eixo log), com área dos marcadores
+    proporcional às mortes, como no px.scatter anterior (size_max=60).
+    """
+    # O plotly só é importado quando o gráfico é montado; a tabela não depende dele
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    sizeref = 2. * max(table["Mortes Acumuladas"].max(), 1) / SIZE_MAX ** 2
+    states = pd.unique(table["state"])
+    palette = px.colors.qualitative.Plotly
+    colors = {state: palette[i % len(palette)] for i, state in enumerate(states)}
+    layout = dict(xaxis=dict(type="log", title="Casos Confirmados"), yaxis=dict(title="Mortalidade"),
+                  legend=dict(title="state"), height=600)
+    if not animate:
+        fig = go.Figure(layout=layout)
+        for state, group in table.groupby("state", sort=False):
+            fig.add_trace(go.Scattergl(
+                x=group["Casos Confirmados"].to_numpy(), y=group["Mortalidade"].to_numpy(),
+                mode="markers", name=state, text=group["data"].to_numpy(),
+                marker=_marker(group["Mortes Acumuladas"].to_numpy(), sizeref, colors[state]),
+                hovertemplate="<b>%{text}</b><br>Casos Confirmados: %{x}<br>Mortalidade: %{y:.3f}",
+            ))
+        return fig
+
+    # Um traço por quadro com todos os estados da data; cores por estado fixas
+    table = table.sort_values(["date", "state"])
+    frames = []
+    for day, group in table.groupby("data", sort=True):
+        frames.append(go.Frame(name=day, data=[go.Scattergl(
+            x=group["Casos Confirmados"].to_numpy(), y=group["Mortalidade"].to_numpy(),
+            mode="markers", text=group["state"].to_numpy(),
+            marker=_marker(group["Mortes Acumuladas"].to_numpy(), sizeref,
+                           [colors[s] for s in group["state"]]),
+            hovertemplate="<b>%{text}</b><br>Casos Confirmados: %{x}<br>Mortalidade: %{y:.3f}",
+        )]))
+    x = table["Casos Confirmados"]
+    layout.update(
+        xaxis=dict(type="log", title="Casos Confirmados",
+                   range=[np.log10(max(x[x > 0].min(), 1)), np.log10(x.max()) + .1]),
+        yaxis=dict(title="Mortalidade", range=[0, table["Mortalidade"].max() * 1.1]),
+        showlegend=False,
+        updatemenus=[dict(type="buttons", buttons=[
+            dict(label="▶", method="animate",
+                 args=[None, dict(frame=dict(duration=100, redraw=True), fromcurrent=True)]),
+            dict(label="❚❚", method="animate",
+                 args=[[None], dict(frame=dict(duration=0, redraw=False), mode="immediate")]),
+        ])],
+        sliders=[dict(active=len(frames) - 1, steps=[dict(label=f.name, method="animate",
+                                  args=[[f.name], dict(frame=dict(duration=0, redraw=True), mode="immediate")])
+                             for f in frames])],
+    )
+    return go.Figure(data=frames[-1].data if frames else [], layout=layout, frames=frames)
@@ -0,0 +1,170 @@
+"""
+Cubo de agregação das séries temporais de casos e mortes.
+
+Construído uma vez por snapshot dos dados, guarda a série nacional, um array denso
+(data × estado) e outro (data × município) com todas as métricas, além de um índice
+de região para coluna. Selecionar estados ou municípios passa a ser um recorte das
+colunas escolhidas, independente do tamanho da tabela completa.
+"""
+import numpy as np
+import pandas as pd
+
+METRICS = ["Casos Confirmados", "Mortes Acumuladas"]
+
+
+class AggregationCube:
+    def __init__(self, dates, metrics, national, states, state_labels, cities, city_labels,
+                 version=None):
+        self.version = version
+        self.dates = dates
+        self.metrics = list(metrics)
+        self.national = national
+        self.states = states
+        self.state_labels = state_labels
+        self.state_index = {label: i for i, label in enumerate(state_labels)}
+        self.cities = cities
+        self.city_labels = city_labels
+        self.city_index = {label: i for i, label in enumerate(city_labels)}
+
+    def _metric_columns(self, variables):
+        return [self.metrics.index(v) for v in variables]
+
+    def _long_frame(self, values, labels, region_name, variables):
+        """
+        Monta o DataFrame longo (date, região, variáveis...) a partir do recorte
+        `values` de forma (datas × regiões × variáveis).
+        """
+        n_dates, n_regions = values.shape[:2]
+        frame = pd.DataFrame({
+            "date": np.tile(self.dates.values, n_regions),
+            region_name: np.repeat(np.asarray(labels, dtype=object), n_dates),
+        })
+        for k, variable in enumerate(variables):
+            frame[variable] = values[:, :, k].T.reshape(-1)
+        return frame.dropna(subset=list(variables), how="all").reset_index(drop=True)
+
+    def national_series(self, variables=None):
+        variables = variables or self.metrics
+        values = self.national[:, self._metric_columns(variables)]
+        return self._long_frame(values[:, np.newaxis, :], ["Brasil"], "Brasil", variables)
+
+    def state_series(self, ufs, variables=None):
+        variables = variables or self.metrics
+        columns = [self.state_index[uf] for uf in ufs if uf in self.state_index]
+        values = self.states[:, columns][:, :, self._metric_columns(variables)]
+        return self._long_frame(values, [self.state_labels[c] for c in columns], "Estado", variables)
+
+    def city_series(self, state_cities, variables=None):
+        """
+        :param state_cities: municípios no formato "UF - Município"
+        """
+        variables = variables or self.metrics
+        columns = [self.city_index[c] for c in state_cities if c in self.city_index]
+        values = self.cities[:, columns][:, :, self._metric_columns(variables)]
+        labels = [self.city_labels[c].split(" - ", 1)[1] for c in columns]
+        return self._long_frame(values, labels, "Cidade", variables)
+
+    @property
+    def city_states(self):
+        """
+        Estados que têm municípios no cubo, em ordem alfabética.
+        """
+        return sorted(set(label.split(" - ", 1)[0] for label in self.city_labels))
+
+    def city_totals_by_state(self, variables=None):
+        """
+        Soma dos municípios de cada estado (em `city_states`) por data.
+
+        :return: (totais (datas × estados × variáveis), presente (datas × estados)), com
+            presente indicando se algum município do estado tem dados na data
+        """
+        variables = variables or self.metrics
+        states = self.city_states
+        state_of_city = np.searchsorted(states, [label.split(" - ", 1)[0] for label in self.city_labels])
+        membership = np.zeros((len(self.city_labels), len(states)))
+        membership[np.arange(len(self.city_labels)), state_of_city] = 1
+        values = self.cities[:, :, self._metric_columns(variables)]
+        present = (~np.isnan(values).all(axis=2)).astype(float) @ membership > 0
+        totals = np.einsum("dcv,cs->dsv", np.nan_to_num(values).astype(np.float64), membership)
+        return totals, present
+
+    def subset(self, ufs=(), state_cities=()):
+        """
+        Cubo com a série nacional e só os estados `ufs` e os municípios
+        `state_cities` ("UF - Município").
+        """
+        states = [self.state_index[uf] for uf in ufs if uf in self.state_index]
+        cities = [self.city_index[c] for c in state_cities if c in self.city_index]
+        return AggregationCube(self.dates, self.metrics, self.national,
+                               self.states[:, states], [self.state_labels[s] for s in states],
+                               self.cities[:, cities], [self.city_labels[c] for c in cities],
+                               version=(self.version, "subset", tuple(ufs), tuple(state_cities)))
+
+    def cities_of(self, ufs):
+        prefixes = tuple(f"{uf} - " for uf in ufs)
+        return [label for label in self.city_labels if label.startswith(prefixes)]
+
+
+def _dense(date_codes, region_codes, values, n_dates, n_regions, dtype):
+    array = np.full((n_dates, n_regions, values.shape[1]), np.nan, dtype=dtype)
+    array[date_codes, region_codes] = values
+    return array
+
+
+def build_cube(data, metrics=None, version=None):
+    """
+    Constrói o cubo a partir da tabela longa do brasil.io (caso_full ou obito_cartorio).
+
+    Linhas com `place_type == "state"` alimentam o array de estados e linhas com
+    `place_type == "city"` o de municípios e a série nacional, a menos que a tabela
+    traga linhas `place_type == "country"`. Tabelas sem `place_type` são tratadas como
+    séries estaduais.
+    """
+    metrics = list(metrics or METRICS)
+    date_codes, dates = pd.factorize(data["date"], sort=True)
+    dates = pd.DatetimeIndex(dates)
+    n_dates = len(dates)
+    values = data[metrics].to_numpy(dtype=np.float64)
+
+    country_rows = None
+    if "place_type" in data.columns:
+        place_type = data["place_type"].astype(str).to_numpy()
+        state_rows = place_type == "state"
+        city_rows = place_type == "city"
+        if (place_type == "country").any():
+            country_rows = place_type == "country"
+    else:
+        state_rows = np.ones(len(data), dtype=bool)
+        city_rows = None
+
+    state_codes, state_labels = pd.factorize(data["state"].astype(str).to_numpy()[state_rows], sort=True)
+    states = _dense(date_codes[state_rows], state_codes, values[state_rows],
+                    n_dates, len(state_labels), np.float64)
+
+    if city_rows is not None:
+        city_keys = data["state"].astype(str).to_numpy()[city_rows] + " - " + \
+            data["city"].astype(str).to_numpy()[city_rows]
+        city_codes, city_labels = pd.factorize(city_keys, sort=True)
+        cities = _dense(date_codes[city_rows], city_codes, values[city_rows],
+                        n_dates, len(city_labels), np.float32)
+        national_rows = city_rows
+    else:
+        city_labels = np.array([], dtype=object)
+        cities = np.full((n_dates, 0, len(metrics)), np.nan, dtype=np.float32)
+        national_rows = state_rows
+
+    if country_rows is not None:
+        # Série nacional já calculada (ex.: métricas derivadas, que não são somáveis)
+        national = _dense(date_codes[country_rows], np.zeros(country_rows.sum(), dtype=int),
+                          values[country_rows], n_dates, 1, np.float64)[:, 0]
+    else:
+        # Soma por data; datas sem nenhuma linha ficam como NaN
+        national = np.full((n_dates, len(metrics)), np.nan)
+        row_count = np.bincount(date_codes[national_rows], minlength=n_dates)
+        for k in range(len(metrics)):
+            column = np.nan_to_num(values[national_rows, k])
+            totals = np.bincount(date_codes[national_rows], weights=column, minlength=n_dates)
+            national[row_count > 0, k] = totals[row_count > 0]
+
+    return AggregationCube(dates, metrics, national, states, list(state_labels),
+                           cities, list(city_labels), version=version)
@@ -1,108 +1,308 @@
-import json
-import datetime
 import numpy as np
 import pandas as pd
-import plotly.express as px
 import streamlit as st
-import episem
-import requests
-import io
-import gzip
-from urllib.request import Request, urlopen
-
+import os
+import time
+
+import cfr
+import cube
+import derived
+import excess
+import fetch
+import jhu
+import memo
+import metrics
+import refresher
+import rt
 import settings
+import snapshot
 
 ### data sources
 BRASIL_IO_COVID19 = "https://data.brasil.io/dataset/covid19/caso_full.csv.gz"
 BRASIL_IO_CART = "https://data.brasil.io/dataset/covid19/obito_cartorio.csv.gz"
 
 
-@st.cache(ttl=settings.CACHE_TTL)
-def get_data():
-    request = Request(BRASIL_IO_COVID19, headers={"User-Agent": "python-urllib"})
-    response = urlopen(request)
-    cases = pd.read_csv(io.StringIO(gzip.decompress(response.read()).decode("utf-8")),
-                        low_memory=False).rename(columns={"last_available_confirmed": "Casos Confirmados",
-                          "last_available_deaths": "Mortes Acumuladas"})
+CASES_SNAPSHOT = "caso_full"
+CASES_RENAME = {"last_available_confirmed": "Casos Confirmados",
+                "last_available_deaths": "Mortes Acumuladas",
+                "estimated_population_2019": "População estimada"}
+DERIVED_SNAPSHOT = "caso_full_derived"
+JHU_GLOBAL_CONFIRMED = (
+    "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/"
+    "csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_"
+    "confirmed_global.csv"
+)
+
+
+# Colunas e tipos do caso_full usados por cada página do dashboard.
+# Apenas a união destas colunas é lida.
+CASES_PROFILES = {
+    "Modelos": {
+        "date": "datetime64[ns]",
+        "place_type": "category",
+        "Casos Confirmados": "int32",
+        "Mortes Acumuladas": "int32",
+    },
+    "Casos e Mortes no Brasil": {
+        "date": "datetime64[ns]",
+        "state": "category",
+        "city": "category",
+        "place_type": "category",
+        "Casos Confirmados": "int32",
+        "Mortes Acumuladas": "int32",
+        "População estimada": "float64",
+    },
+    "Mortes registradas em cartório": {
+        "date": "datetime64[ns]",
+        "state": "category",
+        "place_type": "category",
+        "Mortes Acumuladas": "int32",
+    },
+    "Distribuição Geográfica": {
+        "date": "datetime64[ns]",
+        "state": "category",
+        "city": "category",
+        "place_type": "category",
+        "is_last": "bool",
+        "Casos Confirmados": "int32",
+        "Mortes Acumuladas": "int32",
+    },
+}
+
+CART_PROFILES = {
+    "Mortes registradas em cartório": {
+        "date": "datetime64[ns]",
+        "state": "category",
+        "deaths_covid19": "float64",
+    },
+}
+
+# Tamanho (bytes) do último DataFrame carregado de cada snapshot; as colunas numéricas
+# são memory-maps do arquivo, compartilhados entre os processos
+frame_memory = {}
+
+
+def profile_dtypes(profiles):
+    """
+    União das colunas e tipos declarados pelas páginas.
+    """
+    dtypes = {}
+    for profile in profiles.values():
+        dtypes.update(profile)
+    return dtypes
+
+
+def read_csv_profile(stream, dtypes=None, rename_cols=None):
+    """
+    Lê do CSV apenas as colunas de `dtypes`, já com os tipos declarados.
+    As chaves de `dtypes` usam os nomes após `rename_cols`.
+    """
+    if dtypes is None:
+        return pd.read_csv(stream, low_memory=False).rename(columns=rename_cols or {})
+    source_names = {new: old for old, new in (rename_cols or {}).items()}
+    csv_dtypes = {}
+    parse_dates = []
+    for col, dtype in dtypes.items():
+        if dtype.startswith("datetime"):
+            parse_dates.append(source_names.get(col, col))
+        else:
+            csv_dtypes[source_names.get(col, col)] = dtype
+    df = pd.read_csv(stream, usecols=[source_names.get(c, c) for c in dtypes],
+                     dtype=csv_dtypes, parse_dates=parse_dates)
+    return df.rename(columns=rename_cols or {})
+
+
+def snapshot_name(source):
+    return os.path.basename(source).split(".")[0]
+
+
+def refresh_snapshot(name, source, parse, columns=None, max_age=0):
+    """
+    Atualiza o snapshot `name` a partir de `source`. Se a fonte não mudou desde o
+    último download, apenas renova a validade do snapshot existente. Atualizações
+    simultâneas do mesmo snapshot são reunidas numa só: entre threads pelo
+    single-flight e entre processos pelo lock do snapshot; quem esperou o lock usa a
+    versão que o outro processo acabou de gravar em vez de baixar de novo.
+
+    :param columns: colunas que o snapshot precisa ter; se faltar alguma, a fonte é
+        baixada de novo mesmo sem modificação
+    :param max_age: não consulta a fonte se o snapshot foi verificado há menos de
+        `max_age` segundos
+    :return: FetchResult, ou None se a fonte não foi consultada
+    """
+    return refresher.flights.do(name, lambda: _refresh_snapshot(name, source, parse, columns, max_age))
+
+
+def _refresh_snapshot(name, source, parse, columns, max_age):
+    requested = time.time()
+    with snapshot.lock(name):
+        previous = snapshot.read_meta(name) if snapshot.exists(name) else {}
+        missing = columns is not None and not set(columns) <= set(previous.get("columns") or [])
+        if previous and not missing and previous.get("checked_at", 0) >= requested - max_age:
+            metrics.count_refresh(name, "skipped")
+            return None
+        try:
+            result = fetch.fetch(source, parse, validators=None if missing else previous)
+        except Exception:
+            metrics.count_refresh(name, "error")
+            raise
+        metrics.observe_fetch(name, result)
+        if result.not_modified:
+            snapshot.touch(name, result.as_meta())
+        else:
+            snapshot.write_snapshot(name, result.data, result.as_meta())
+    return result
+
+
+def ensure_snapshot(name, source, parse, columns=None):
+    """
+    Garante que o snapshot `name` existe e contém `columns`. Snapshots vencidos
+    (CACHE_TTL) são atualizados aqui apenas se o atualizador em segundo plano não
+    estiver rodando; se a atualização falhar, o último snapshot continua valendo.
+    """
+    available = snapshot.read_meta(name).get("columns") or []
+    if not snapshot.exists(name) or (columns is not None and not set(columns) <= set(available)):
+        refresh_snapshot(name, source, parse, columns)
+    elif not snapshot.is_fresh(name) and not refresher.is_running():
+        try:
+            refresh_snapshot(name, source, parse)
+        except Exception:
+            refresher.logger.exception("Falha ao atualizar %s; mantendo o último snapshot", name)
+
+
+@memo.memoize(maxsize=8)
+def read_snapshot_version(name, meta, columns=None):
+    df = snapshot.read_snapshot(name, columns=list(columns) if columns else None, meta=meta)
+    df.attrs["version"] = (name, meta["version"], meta["file"], columns)
+    frame_memory[name] = int(df.memory_usage(deep=True).sum())
+    return df
 
 
-    cases["date"] = pd.to_datetime(cases["date"])
+def load_snapshot(name, source, parse, columns=None):
+    ensure_snapshot(name, source, parse, columns)
+    # A versão e o arquivo vêm dos mesmos metadados, e o arquivo de uma versão nunca
+    # muda: a leitura não precisa do lock
+    meta = snapshot.read_meta(name)
+    return read_snapshot_version(name, {"version": meta["version"], "file": meta["file"]},
+                                 tuple(columns) if columns else None)
 
-    return cases
 
+def cases_parser():
+    dtypes = profile_dtypes(CASES_PROFILES)
+    return lambda stream: read_csv_profile(stream, dtypes, CASES_RENAME)
 
-@st.cache(ttl=settings.CACHE_TTL)
-def get_data_from_source(source, usecols=None, rename_cols=None):
-    request = Request(source, headers={"User-Agent": "python-urllib"})
-    response = urlopen(request)
-    df = pd.read_csv(io.StringIO(gzip.decompress(response.read()).decode("utf-8")), usecols=usecols)
+
+def get_data():
+    return load_snapshot(CASES_SNAPSHOT, BRASIL_IO_COVID19, cases_parser(),
+                         columns=list(profile_dtypes(CASES_PROFILES)))
+
+
+@memo.memoize(maxsize=8)
+def _rename(df, rename_cols):
+    renamed = df.rename(columns=rename_cols)
+    renamed.attrs["version"] = (memo.version_of(df), "rename", tuple(sorted(rename_cols.items())))
+    return renamed
+
+
+def get_data_from_source(source, usecols=None, rename_cols=None, dtypes=None):
+    if dtypes is not None:
+        usecols = list(dtypes)
+    df = load_snapshot(snapshot_name(source), source,
+                       lambda stream: read_csv_profile(stream, dtypes),
+                       columns=usecols)
     if rename_cols:
-        df.rename(columns=rename_cols, inplace=True)
-    df["date"] = pd.to_datetime(df["date"])
+        df = _rename(df, rename_cols)
     return df
 
 
-@st.cache(suppress_st_warning=True, ttl=settings.CACHE_TTL, allow_output_mutation=True)
-def get_data_uf(data, uf, city_options, variable):
+@memo.memoize(maxsize=4)
+def build_cube(data, metrics=None):
+    return cube.build_cube(data, metrics=metrics, version=memo.version_of(data))
+
+
+def get_cube():
+    return build_cube(get_data())
+
+
+@memo.memoize(maxsize=2)
+def build_derived_cube(data):
+    """
+    Cubo das métricas derivadas (derived.DERIVED). A tabela é calculada uma vez por
+    snapshot do caso_full e guardada ao lado dele; as demais sessões e processos
+    apenas a leem.
+    """
+    source_version = repr(memo.version_of(data))
+    # Sob o lock, só um processo calcula a tabela de cada versão do caso_full
+    with snapshot.lock(DERIVED_SNAPSHOT):
+        meta = snapshot.read_meta(DERIVED_SNAPSHOT)
+        if not snapshot.exists(DERIVED_SNAPSHOT) or meta.get("source_version") != source_version:
+            data_cube = build_cube(data)
+            table = derived.derived_table(data_cube, derived.populations(data, data_cube))
+            meta = snapshot.write_snapshot(DERIVED_SNAPSHOT, table, {"source_version": source_version,
+                                                                     "version": source_version})
+    table = snapshot.read_snapshot(DERIVED_SNAPSHOT, meta=meta)
+    return cube.build_cube(table, metrics=derived.DERIVED, version=(memo.version_of(data), "derived"))
+
+
+def get_derived_cube():
+    return build_derived_cube(get_data())
+
+
+@memo.memoize(maxsize=2)
+def build_rt_cube(derived_cube):
+    """
+    Rt de todas as regiões com o intervalo serial padrão, uma vez por snapshot.
+    """
+    return rt.build_rt_cube(derived_cube)
+
+
+@memo.memoize(maxsize=64)
+def build_rt_selection(derived_cube, uf, city_options, mean, sd):
+    """
+    Rt com outro intervalo serial só para o país e as regiões selecionadas.
+    """
+    return rt.build_rt_cube(derived_cube.subset(uf or (), city_options or ()), mean, sd)
+
+
+def get_rt_cube(mean=rt.SERIAL_INTERVAL_MEAN, sd=rt.SERIAL_INTERVAL_SD, uf=None, city_options=None):
+    derived_cube = get_derived_cube()
+    if (mean, sd) == (rt.SERIAL_INTERVAL_MEAN, rt.SERIAL_INTERVAL_SD):
+        return build_rt_cube(derived_cube)
+    return build_rt_selection(derived_cube, uf, city_options, mean, sd)
+
+
+def get_cart_cube():
+    data = get_data_from_source(BRASIL_IO_CART, dtypes=profile_dtypes(CART_PROFILES))
+    return build_cube(data, metrics=["deaths_covid19"])
+
+
+@memo.memoize(maxsize=256)
+def get_data_uf(data_cube, uf, city_options, variables=cube.METRICS):
+    """
+    Séries de `variables` para o Brasil, os estados em `uf` ou os municípios em
+    `city_options` ("UF - Município"), num único DataFrame longo.
+    """
     if uf:
-        data = data.loc[data.state.isin(uf)]
         if city_options:
             region_name = "Cidade"
-            city_options = [c.split(" - ")[1] for c in city_options]
-            data = data.loc[
-                (data.city.isin(city_options)) & (data.place_type == "city")
-                ][["date", "state", "city", variable]]
-            pivot_data = data.pivot_table(values=variable, index="date", columns="city")
-            data = pd.DataFrame(pivot_data.to_records())
+            data = data_cube.city_series(city_options, variables)
         else:
             region_name = "Estado"
-            data = data.loc[data.place_type == "state"][["date", "state", variable]]
-            pivot_data = data.pivot_table(values=variable, index="date", columns="state")
-            data = pd.DataFrame(pivot_data.to_records())
-
+            data = data_cube.state_series(uf, variables)
     else:
         region_name = "Brasil"
-        data = data.loc[data.place_type == "city"].groupby("date")[variable].sum().to_frame().reset_index()
+        data = data_cube.national_series(variables)
+    return region_name, data
 
-    melted_data = pd.melt(
-        data,
-        id_vars=['date'],
-        var_name=region_name,
-        value_name=variable,
-    )
-    return region_name, melted_data
 
-
-def get_data_cart(data, uf, variable):
-    if uf:
-        data = data.loc[data.state.isin(uf)]
-        # if city_options:
-        #    region_name = "Cidade"
-        #    city_options = [c.split(" - ")[1] for c in city_options]
-        #    data = data.loc[
-        #        (data.city.isin(city_options)) & (data.place_type == "city")
-        #    ][["date", "state", "city", variable]]
-        #    pivot_data = data.pivot_table(values=variable, index="date", columns="city")
-        #    data = pd.DataFrame(pivot_data.to_records())
-        # else:
-        region_name = "Estado"
-        data = data.loc[:, ["date", "state", variable]]
-        pivot_data = data.pivot_table(values=variable, index="date", columns="state")
-        data = pd.DataFrame(pivot_data.to_records())
-    else:
-        region_name = "Brasil"
-        data = data.groupby("date")[variable].sum().to_frame().reset_index()
-
-    melted_data = pd.melt(
-        data,
-        id_vars=['date'],
-        var_name=region_name,
-        value_name=variable,
-    )
-    return region_name, melted_data
+def get_data_cart(data_cube, uf, variables=("deaths_covid19",)):
+    return get_data_uf(data_cube, uf, None, list(variables))
 
 
 def plot_series(data, x_variable, y_variable, region_name, is_log, label=None):
+    # plotly.express é importado na primeira página que desenha uma série
+    import plotly.express as px
+
     if is_log:
         data = data.copy()
         log_y_variable = f"Log[{y_variable}]"
@@ -179,50 +379,77 @@ def get_aligned_data(df, align=100):
     return aligned_df
 
 
-@st.cache(ttl=settings.CACHE_TTL)
-def get_city_list(data, uf):
-    data_filt = data.loc[(data.state.isin(uf)) & (data.place_type == "city")]
-    data_filt["state_city"] = data_filt["state"] + " - " + data_filt["city"]
-    return sorted(list(data_filt.state_city.drop_duplicates().values))
+@memo.memoize(maxsize=64)
+def get_city_list(data_cube, uf):
+    return data_cube.cities_of(uf)
 
 
-def _translate(country_name, names):
-    if country_name in names:
-        return names[country_name]
-    else:
-        return country_name
+def get_global_cases():
+    return load_snapshot(snapshot_name(JHU_GLOBAL_CONFIRMED), JHU_GLOBAL_CONFIRMED, read_csv_profile)
 
 
-@st.cache(ttl=settings.CACHE_TTL)
-def get_global_cases():
-    url = (
-        "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/"
-        "csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_"
-        "confirmed_global.csv"
-    )
-    country_names = json.load(open("dashboard/nomes-paises.json"))
-    global_cases = pd.read_csv(url)
-    global_cases["Country/Region"] = global_cases["Country/Region"] \
-        .map(lambda x: _translate(x, country_names))
-    global_cases = global_cases.rename(columns={"Country/Region": "País/Região"})
-    return global_cases
+@memo.memoize(maxsize=2)
+def build_country_matrix(global_cases):
+    return jhu.build_country_matrix(global_cases, version=memo.version_of(global_cases))
 
 
-@st.cache(ttl=settings.CACHE_TTL)
-def get_countries_list(data):
-    return sorted(list(data["País/Região"].drop_duplicates()))
+def get_country_matrix():
+    return build_country_matrix(get_global_cases())
+
 
+def get_countries_list(matrix):
+    return matrix.countries
 
-@st.cache(suppress_st_warning=True)
-def get_countries_data(data, countries):
+
+@memo.memoize(maxsize=64)
+def get_countries_data(matrix, countries, x_variable="Data", y_variable="Casos"):
     if countries:
-        region_name = "País/Região"
-        result = data.loc[data[region_name].isin(countries)] \
-            .groupby([region_name, "Data"]).sum().reset_index()
-    else:
-        region_name = None
-        result = data.groupby("Data").sum().reset_index()
-    return region_name, result
+        return jhu.REGION_NAME, matrix.select(countries, x_variable, y_variable)
+    return None, matrix.world(x_variable, y_variable)
+
+
+# Com vários processos, cada atualizador só consulta a fonte se nenhum outro o fez
+# na última meia rodada
+REFRESH_MAX_AGE = settings.REFRESH_INTERVAL // 2
+
+
+def warm_cases():
+    """
+    Atualiza o caso_full e reconstrói as tabelas derivadas usadas pelas páginas.
+    """
+    refresh_snapshot(CASES_SNAPSHOT, BRASIL_IO_COVID19, cases_parser(), max_age=REFRESH_MAX_AGE)
+    data = get_data()
+    data_cube = get_cube()
+    get_derived_cube()
+    get_rt_cube()
+    get_cfr_table(data_cube)
+    get_excess_table(data)
+    get_latest_values(data)
+
+
+def warm_cart():
+    dtypes = profile_dtypes(CART_PROFILES)
+    refresh_snapshot(snapshot_name(BRASIL_IO_CART), BRASIL_IO_CART,
+                     lambda stream: read_csv_profile(stream, dtypes), max_age=REFRESH_MAX_AGE)
+    get_cart_cube()
+
+
+def warm_global_cases():
+    refresh_snapshot(snapshot_name(JHU_GLOBAL_CONFIRMED), JHU_GLOBAL_CONFIRMED, read_csv_profile,
+                     max_age=REFRESH_MAX_AGE)
+    get_country_matrix()
+
+
+REFRESH_JOBS = {
+    CASES_SNAPSHOT: warm_cases,
+    snapshot_name(BRASIL_IO_CART): warm_cart,
+    snapshot_name(JHU_GLOBAL_CONFIRMED): warm_global_cases,
+}
+
+
+def start_refresher():
+    if settings.BACKGROUND_REFRESH:
+        return refresher.start(REFRESH_JOBS, settings.REFRESH_INTERVAL)
 
 
 @st.cache(persist=True, allow_output_mutation=True, ttl=settings.CACHE_TTL)
@@ -231,36 +458,66 @@ def load_lat_long():
     return pd.read_csv(path_mapas)
 
 
-# @st.cache(persist=True, ttl=settings.CACHE_TTL)
-def plot_scatter_CFR(data):
-    df_states = data[data.place_type != 'state'].groupby(['date', 'state']).sum()
-    df_states.reset_index(inplace=True)
-    df_states.set_index('date', inplace=True)
-    df_states['Mortalidade'] = df_states['Mortes Acumuladas'] / df_states['Casos Confirmados']
-    df_states['data'] = [x.date() for x in df_states.index]
-    fig = px.scatter(df_states[df_states.data > datetime.date(2020, 3, 15)], x="Casos Confirmados",
-                     y="Mortalidade", size="Mortes Acumuladas",
-                     color="state",
-                     opacity=0.6,
-                     #                  animation_frame="data",
-                     hover_name="data", log_x=True, log_y=False, size_max=60)
-    st.plotly_chart(fig)
+@memo.memoize(maxsize=2)
+def get_latest_values(data):
+    """
+    Últimos valores de cada estado e município (linhas com `is_last`), uma linha
+    por região.
+    """
+    columns = ["place_type", "state", "city", "date", "Casos Confirmados", "Mortes Acumuladas"]
+    latest = data.loc[data["is_last"].to_numpy(), columns].reset_index(drop=True)
+    latest.attrs["version"] = (memo.version_of(data), "latest")
+    return latest
+
+
+@memo.memoize(maxsize=2)
+def get_state_map_data(data):
+    """
+    Coordenadas dos estados (mapas/Estados.csv) com os últimos números de casos e
+    mortes, no formato usado pela ColumnLayer da página do mapa.
+    """
+    latest = get_latest_values(data)
+    states = latest[latest["place_type"].astype(str).to_numpy() == "state"]
+    states = pd.DataFrame({
+        "Estados": states["state"].astype(str).to_numpy(),
+        "casos": states["Casos Confirmados"].to_numpy(),
+        "mortes": states["Mortes Acumuladas"].to_numpy(),
+    })
+    estados = load_lat_long()[["Estados", "Latitude", "Longitude"]].merge(states, on="Estados", how="left")
+    estados[["casos", "mortes"]] = estados[["casos", "mortes"]].fillna(0).astype(int)
+    return estados
+
+
+@memo.memoize(maxsize=2)
+def get_cfr_table(data_cube):
+    return cfr.cfr_table(data_cube)
+
+
+@memo.memoize(maxsize=4)
+def get_cfr_figure(data_cube, animate=False):
+    return cfr.cfr_figure(get_cfr_table(data_cube), animate)
+
+
+def plot_scatter_CFR(data_cube, animate=False):
+    st.plotly_chart(get_cfr_figure(data_cube, animate))
+
+
+@memo.memoize(maxsize=1)
+def get_baselines():
+    return excess.load_baselines()
+
+
+@memo.memoize(maxsize=2)
+def get_excess_table(data):
+    return excess.build_excess_table(data, get_baselines(), version=memo.version_of(data))
 
 
 def plot_excess_deaths(data, estado, only_viral=True):
-    obitos = data[(data.state == estado) & (data.place_type == 'state')][
-        ['date', 'Casos Confirmados', 'Mortes Acumuladas']]
-    obitos['data'] = pd.to_datetime(obitos.date)
-    obitos.set_index('data', inplace=True)
-    obitos.sort_index(inplace=True)
-    obitos['incidencia'] = obitos['Mortes Acumuladas'].diff()
-    obitos['ew'] = [int(episem.episem(x, out='W')) for x in obitos.index]
-    if only_viral:
-        ob_sim = pd.read_csv(f'dashboard/dados/baseline_{estado}.csv.gz')
-    else:
-        ob_sim = pd.read_csv(f'dashboard/dados/baseline_{estado}_all_resp.csv.gz')
-    obitos_W = obitos.groupby('ew').sum().incidencia.iloc[:-1]
-    # obitos_W.reset_index()
+    import plotly.express as px
+
+    table = get_excess_table(data)
+    ob_sim = table.baseline(estado, only_viral)
+    obitos_W = table.observed_deaths(estado)
     fig = px.line(ob_sim, x=ob_sim.index, y='median', line_shape='spline')
     fig.add_scatter(x=ob_sim.index, y=ob_sim.perc_25, name='1⁰ quartil', fill='tonexty',
                     hovertemplate="1⁰ quartil: %{y:.0f} SE: %{x}"
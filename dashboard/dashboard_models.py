@@ -1,26 +1,188 @@
-import altair as alt
+import os
+
+import humanizer_portugues as hp
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 from datetime import timedelta
 import matplotlib.pyplot as plt
 
-from epimodels.continuous.models import SEQIAHR
+import calibration
 import dashboard_data
-import settings
+import ensemble
+import memo
+import metrics
+import seqiahr
+
+
+@memo.memoize(32)
+def normalized_model(params, inits=None, trange=None):
+    """
+    Trajetórias do SEQIAHR em frações da população e os números que derivam delas.
+    Não dependem da população em risco, por isso a chave da cache tem só os parâmetros
+    epidemiológicos; mudar N nunca reintegra o modelo.
+    """
+    with metrics.ode_solve():
+        times, states = seqiahr.simulate(params, inits=inits, trange=trange)
+    traces = seqiahr.as_traces(times, states)
+    I, H, C, D, R = (traces[v] for v in ["I", "H", "C", "D", "R"])
+    daily_deaths = np.diff(D, prepend=np.nan)
+    summary = {
+        'pico_infectados': I.max(),
+        'pico_hosp': H.max(),
+        'dia_pico_hosp': int(H.argmax()),
+        'pico_mortes': D[np.nanargmax(daily_deaths)],
+        'dia_pico_mortes': int(np.nanargmax(daily_deaths)),
+        'hospitalizacoes_totais': C[-1],
+        'mortes_totais': D[-1],
+        'recuperados': R[-1],
+    }
+    return traces, summary
 
 
-@st.cache(suppress_st_warning=True, ttl=settings.CACHE_TTL)
 def seqiahr_model(inits=None, trange=None, N=97.3e6, params=None):
-    if inits is None:
-        inits = [.99, 0, 1e-6, 0, 0, 0, 0, 0]
+    """
+    Trajetórias normalizadas (ver `normalized_model`); `N` é mantido por
+    compatibilidade e não altera o resultado.
+    """
+    return normalized_model(params, inits, trange)[0]
+
+
+def model_stats(summary, N):
+    """
+    Tabela de picos e totais da simulação na escala da população em risco.
+    """
+    inf_tot = N - summary['recuperados'] - summary['mortes_totais']
+    return pd.DataFrame(data={'Pico': [hp.intword(summary['pico_infectados'] * N),
+                                       hp.intword(summary['pico_hosp'] * N),
+                                       hp.intword(summary['pico_mortes'] * N)],
+                              'Total': [hp.intword(inf_tot),
+                                        hp.intword(summary['hospitalizacoes_totais'] * N),
+                                        hp.intword(summary['mortes_totais'] * N)]},
+                        index=['Infecções', 'Hospitalizações', 'Mortes'])
+
+
+@memo.memoize(32)
+def seqiahr_scenarios(params, name, values, inits=None, trange=None):
+    """
+    Simula, numa única integração em lote, as variações de `params` com o
+    parâmetro `name` assumindo cada um de `values`.
+    """
+    times, states = seqiahr.simulate(seqiahr.scenarios(params, name, values), inits=inits, trange=trange)
+    return [seqiahr.as_traces(times, states, i) for i in range(len(values))]
+
+
+def iter_calibrate(data_cube, uf, N, fixed, start=None):
+    """
+    Iterações do ajuste de `calibrate` (ver calibration.iter_fit), sem cache, para
+    que a página mostre o progresso.
+    """
+    region_name, data = dashboard_data.get_data_uf(data_cube, [uf] if uf else False, [])
+    first_date, days, cases, deaths = calibration.observed_series(data)
+    params = dict(start or calibration.START, **fixed)
+    return calibration.iter_fit(days, cases, deaths, N, params, warm=start is not None,
+                                pool=ensemble.get_pool(), chunks=os.cpu_count())
+
+
+@memo.memoize(64)
+def calibrate(data_cube, uf, N, fixed, start=None):
+    """
+    Ajusta os parâmetros calibration.FIT_PARAMETERS e o atraso da notificação às séries
+    do Brasil (uf=False) ou de um estado. O resultado fica em cache por região, snapshot
+    dos dados, população, parâmetros fixos (`fixed`, os demais parâmetros do modelo) e
+    ponto de partida.
+
+    :param start: parâmetros de um ajuste anterior (warm start, ex.: o do Brasil para
+        um estado); None parte de calibration.START
+    """
+    for result in iter_calibrate(data_cube, uf, N, fixed, start):
+        pass
+    return result
+
+
+@memo.memoize(16)
+def seqiahr_ensemble(params, spread, names, n_draws, seed=0):
+    """
+    Quantis diários (ensemble.QUANTILES) de cada compartimento para `n_draws`
+    sorteios dos parâmetros `names` em ±`spread` dos valores de `params`.
+
+    A página roda o mesmo ensemble com `ensemble.iter_ensemble` para mostrar o
+    progresso e guarda o resultado com `seqiahr_ensemble.store`.
+    """
+    return ensemble.run_ensemble(params, spread, names, n_draws, seed=seed)
+
+
+def plot_model_bands(times, bands, variable, N):
+    """
+    Mediana com as faixas de 50% e 90% do ensemble para um compartimento.
+    """
+    k = seqiahr.STATE_VARIABLES.index(variable)
+    p5, p25, p50, p75, p95 = bands[:, :, k] * N
+    fig = go.Figure()
+    for lower, upper, label, opacity in [(p5, p95, 'Faixa de 90%', .2), (p25, p75, 'Faixa de 50%', .4)]:
+        fig.add_trace(go.Scatter(x=times, y=lower, mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=times, y=upper, mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f'rgba(31,119,180,{opacity})', name=label))
+    fig.add_trace(go.Scatter(x=times, y=p50, mode='lines', line=dict(color='rgb(31,119,180)'),
+                             name='Mediana'))
+    fig.update_layout(
+        height=500,
+        xaxis_title="Dias",
+        yaxis_title="Indivíduos",
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend_orientation="h",
+        legend=dict(
+            y=-0.15,
+        ),
+    )
+    fig.update_xaxes(
+        showgrid=True, gridwidth=1, gridcolor='rgb(211,211,211)',
+        showline=True, linewidth=1, linecolor='black',
+    )
+    fig.update_yaxes(
+        showgrid=True, gridwidth=1, gridcolor='rgb(211,211,211)',
+        showline=True, linewidth=1, linecolor='black',
+    )
+    st.plotly_chart(fig)
 
-    if trange is None:
-        trange = [0, 365]
 
-    model = SEQIAHR()
-    model(inits=inits, trange=trange, totpop=N, params=params, t_eval=range(*trange))
-    return model.traces
+def prepare_scenario_data(scenario_traces, labels, variable, column_names, N):
+    frames = []
+    for label, traces in zip(labels, scenario_traces):
+        traces = pd.DataFrame(data=traces).rename(columns=column_names)
+        frames.append(pd.DataFrame({
+            'time': traces['time'],
+            'Cenário': label,
+            'Indivíduos': traces[variable] * N,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def plot_scenarios(scenario_data, variable):
+    fig = px.line(scenario_data, x="time", y="Indivíduos", color='Cenário', height=500)
+    fig.update_layout(
+        title=variable,
+        xaxis_title="Dias",
+        yaxis_title="Indivíduos",
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend_orientation="h",
+        legend_title="",
+        legend=dict(
+            y=-0.15,
+        ),
+    )
+    fig.update_xaxes(
+        showgrid=True, gridwidth=1, gridcolor='rgb(211,211,211)',
+        showline=True, linewidth=1, linecolor='black',
+    )
+    fig.update_yaxes(
+        showgrid=True, gridwidth=1, gridcolor='rgb(211,211,211)',
+        showline=True, linewidth=1, linecolor='black',
+    )
+    st.plotly_chart(fig)
 
 
 def prepare_model_data(model_data, variables, column_names, N):
@@ -98,7 +260,7 @@ def plot_model(melted_traces, q, r):
     # st.plotly_chart(fig2)
 
 
-def plot_predictions(offset, melted_traces, dias=365):
+def plot_predictions(offset, melted_traces, dias=365, uf=False):
     htrace = melted_traces[melted_traces.Estado == 'Hospitalizações Acumuladas']
     mtrace = melted_traces[melted_traces.Estado == 'Mortes Acumuladas']
     htrace.loc[:, 'dtime'] = htrace.time.astype(int)
@@ -106,9 +268,11 @@ def plot_predictions(offset, melted_traces, dias=365):
     htrace = htrace.groupby('dtime').mean()
     mtrace = mtrace.groupby('dtime').mean()
 
-    data = dashboard_data.get_data()
-    region_name, data_uf = dashboard_data.get_data_uf(data, False, [], "Casos Confirmados")
-    region_name, m_data_uf = dashboard_data.get_data_uf(data, False, [], "Mortes Acumuladas")
+    data_cube = dashboard_data.get_cube()
+    region_name, data_uf = dashboard_data.get_data_uf(data_cube, [uf] if uf else False, [])
+    # get_data_uf devolve um DataFrame compartilhado
+    data_uf = data_uf.copy()
+    m_data_uf = data_uf.copy()
     drange = pd.date_range(data_uf[data_uf['Casos Confirmados'] > 0].date.min() - timedelta(offset),
                            periods=dias,
                            freq='D')
@@ -0,0 +1,167 @@
+"""
+Métricas derivadas das séries acumuladas de casos e mortes.
+
+Calculadas uma vez por snapshot para o país, os 27 estados e todos os municípios ao
+mesmo tempo, sobre os arrays densos (data × região) do cubo de agregação: casos e
+mortes novos, médias móveis de 7 dias, taxas por 100 mil habitantes e tempo de
+duplicação dos casos. O resultado é uma tabela longa ordenada por (região, data),
+no mesmo formato do caso_full, que pode ser guardada como snapshot e carregada num
+novo cubo.
+"""
+import numpy as np
+import pandas as pd
+
+WINDOW = 7
+DERIVED = [
+    "Novos Casos",
+    "Novas Mortes",
+    "Novos Casos (média 7 dias)",
+    "Novas Mortes (média 7 dias)",
+    "Casos por 100 mil",
+    "Mortes por 100 mil",
+    "Tempo de duplicação (dias)",
+]
+POPULATION = "População estimada"
+
+
+def forward_fill(values):
+    """
+    Repete o último valor conhecido ao longo das datas (eixo 0).
+    """
+    present = ~np.isnan(values)
+    index = np.where(present, np.arange(len(values))[:, np.newaxis], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = values[index, np.arange(values.shape[1])]
+    filled[~present.cumsum(axis=0).astype(bool)] = np.nan
+    return filled
+
+
+def daily_new(cumulative):
+    """
+    Novos casos (ou mortes) por dia; no primeiro dia com dados, o próprio acumulado.
+    """
+    filled = np.nan_to_num(forward_fill(cumulative))
+    new = np.diff(filled, axis=0, prepend=0)
+    new[np.isnan(cumulative)] = np.nan
+    return new
+
+
+def window_sums(values, window):
+    """
+    Somas móveis de `window` dias ao longo do eixo 0, por diferença de somas
+    acumuladas. A primeira linha (zeros) corresponde a "antes do primeiro dia".
+    """
+    padded = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=padded[1:])
+    lagged = np.concatenate([np.zeros((window,) + values.shape[1:]), padded[:-window]])
+    return padded - lagged
+
+
+def rolling_mean(values, window=WINDOW):
+    """
+    Média dos últimos `window` dias com dados, por somas acumuladas.
+    """
+    present = ~np.isnan(values)
+    sums = window_sums(np.nan_to_num(values), window)[1:]
+    counts = window_sums(present.astype(float), window)[1:]
+    mean = np.divide(sums, counts, out=np.full(values.shape, np.nan), where=counts > 0)
+    mean[~present] = np.nan
+    return mean
+
+
+def per_100k(cumulative, population):
+    population = np.where(population > 0, population, np.nan)
+    return cumulative / population * 1e5
+
+
+def doubling_time(cumulative, window=WINDOW):
+    """
+    Tempo de duplicação (dias) estimado pelo crescimento nos últimos `window` dias;
+    NaN quando não há crescimento.
+    """
+    lagged = np.full(cumulative.shape, np.nan)
+    lagged[window:] = cumulative[:-window]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = cumulative / lagged
+        time = window * np.log(2) / np.log(ratio)
+    time[~(ratio > 1)] = np.nan
+    return time
+
+
+def derive(cases, deaths, population, window=WINDOW):
+    """
+    :param cases, deaths: arrays (datas × regiões) acumulados
+    :param population: array (regiões,)
+    :return: array (datas × regiões × len(DERIVED))
+    """
+    cases = cases.astype(np.float64)
+    deaths = deaths.astype(np.float64)
+    new_cases = daily_new(cases)
+    new_deaths = daily_new(deaths)
+    return np.stack([
+        new_cases,
+        new_deaths,
+        rolling_mean(new_cases, window),
+        rolling_mean(new_deaths, window),
+        per_100k(cases, population),
+        per_100k(deaths, population),
+        doubling_time(cases, window),
+    ], axis=-1).astype(np.float32)
+
+
+def populations(data, data_cube):
+    """
+    População de cada estado e município do cubo, a partir das linhas do caso_full,
+    e a do país como soma dos estados.
+    """
+    rows = data[["place_type", "state", "city", POPULATION]].dropna(subset=[POPULATION])
+    place_type = rows["place_type"].astype(str)
+    states = rows[place_type == "state"].groupby(rows["state"].astype(str))[POPULATION].max()
+    city_rows = rows[place_type == "city"]
+    city_keys = city_rows["state"].astype(str) + " - " + city_rows["city"].astype(str)
+    cities = city_rows.groupby(city_keys.values)[POPULATION].max()
+    state_population = states.reindex(data_cube.state_labels).to_numpy(float)
+    city_population = cities.reindex(data_cube.city_labels).to_numpy(float)
+    return np.nansum(state_population), state_population, city_population
+
+
+def _long(values, dates, present, place_type, states, cities):
+    """
+    Tabela longa ordenada por (região, data) a partir de `values` (datas × regiões × métricas).
+    """
+    region, date = np.nonzero(present.T)
+    frame = pd.DataFrame({
+        "place_type": place_type,
+        "state": np.asarray(states, dtype=object)[region],
+        "city": np.asarray(cities, dtype=object)[region],
+        "date": dates.values[date],
+    })
+    for k, metric in enumerate(DERIVED):
+        frame[metric] = values[date, region, k]
+    return frame
+
+
+def derived_table(data_cube, population, window=WINDOW):
+    """
+    Métricas derivadas de todas as regiões do cubo de casos e mortes.
+
+    :param population: (país, estados, municípios) como devolvido por `populations`
+    :return: DataFrame (place_type, state, city, date, DERIVED...), com
+        place_type "country", "state" ou "city"
+    """
+    cases, deaths = (data_cube.metrics.index(m) for m in ["Casos Confirmados", "Mortes Acumuladas"])
+    national_population, state_population, city_population = population
+    levels = [
+        ("country", data_cube.national[:, np.newaxis, :], [national_population], [None], [None]),
+        ("state", data_cube.states, state_population, data_cube.state_labels,
+         [None] * len(data_cube.state_labels)),
+        ("city", data_cube.cities, city_population,
+         [label.split(" - ", 1)[0] for label in data_cube.city_labels],
+         [label.split(" - ", 1)[1] for label in data_cube.city_labels]),
+    ]
+    frames = []
+    for place_type, values, level_population, states, cities in levels:
+        derived = derive(values[:, :, cases], values[:, :, deaths], np.asarray(level_population, float), window)
+        present = ~np.isnan(values[:, :, cases])
+        frames.append(_long(derived, data_cube.dates, present, place_type, states, cities))
+    return pd.concat(frames, ignore_index=True)
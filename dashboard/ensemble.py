@@ -0,0 +1,128 @@
+"""
+Bandas de incerteza para as projeções do SEQIAHR por Monte Carlo.
+
+Conjuntos de parâmetros são sorteados em torno dos valores escolhidos na barra
+lateral e simulados em lotes num pool de processos, reaproveitado entre as
+execuções do script. Os quantis diários de cada compartimento são reduzidos de
+forma incremental, sobre histogramas de tamanho fixo, de modo que a memória não
+cresce com o número de simulações.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import seqiahr
+
+QUANTILES = [5, 25, 50, 75, 95]
+# Bordas dos histogramas: 0 e escala logarítmica até 1 (os traces são frações da população)
+EDGES = np.concatenate([[0.0], np.logspace(-12, 0, 1200)])
+# Parâmetros que são frações e não podem passar de 1
+FRACTIONS = ["chi", "p"]
+
+_pool = None
+
+
+def get_pool():
+    """
+    Pool de processos do módulo, criado na primeira chamada e reaproveitado.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def draw_parameters(params, spread, names, n_draws, seed=None):
+    """
+    Sorteia `n_draws` conjuntos de parâmetros, com os parâmetros em `names`
+    uniformes em [v * (1 - spread), v * (1 + spread)] e os demais fixos.
+
+    :return: array (sorteios × parâmetros) na ordem de seqiahr.PARAMETERS
+    """
+    rng = np.random.RandomState(seed)
+    P = np.repeat(seqiahr.param_matrix(params), n_draws, axis=0)
+    for name in names:
+        j = seqiahr.PARAMETERS.index(name)
+        P[:, j] = rng.uniform(P[:, j] * (1 - spread), P[:, j] * (1 + spread))
+        P[:, j] = np.clip(P[:, j], 0, 1 if name in FRACTIONS else None)
+    return P
+
+
+class StreamingQuantiles:
+    """
+    Quantis aproximados por histograma, atualizados a cada lote de simulações.
+    """
+
+    def __init__(self, shape, edges=EDGES):
+        self.shape = tuple(shape)
+        self.edges = edges
+        self.counts = np.zeros(self.shape + (len(edges),), dtype=np.int64)
+        self.n = 0
+
+    def update(self, values):
+        """
+        :param values: array (simulações,) + shape
+        """
+        n_bins = len(self.edges)
+        bins = np.clip(np.searchsorted(self.edges, values, side="right") - 1, 0, n_bins - 1)
+        cells = np.arange(np.prod(self.shape)).reshape(self.shape) * n_bins + bins
+        self.counts += np.bincount(cells.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.n += values.shape[0]
+
+    def quantiles(self, qs=QUANTILES):
+        """
+        :return: array (quantis,) + shape, interpolando linearmente dentro do bin
+        """
+        cumulative = np.cumsum(self.counts, axis=-1)
+        last = len(self.edges) - 1
+        out = np.empty((len(qs),) + self.shape)
+        for k, q in enumerate(qs):
+            target = q / 100 * self.n
+            idx = np.minimum((cumulative < target).sum(axis=-1), last)[..., np.newaxis]
+            before = np.where(idx > 0, np.take_along_axis(cumulative, np.maximum(idx - 1, 0), -1), 0)
+            count = np.take_along_axis(self.counts, idx, -1)
+            fraction = np.divide(target - before, count, out=np.zeros(count.shape), where=count > 0)
+            lower = self.edges[idx]
+            upper = self.edges[np.minimum(idx + 1, last)]
+            out[k] = (lower + np.clip(fraction, 0, 1) * (upper - lower))[..., 0]
+        return out
+
+
+def _simulate_chunk(P, inits, trange):
+    return seqiahr.simulate(P, inits=inits, trange=trange)
+
+
+def iter_ensemble(params, spread, names, n_draws=200, chunk_size=25, seed=None, inits=None, trange=None):
+    """
+    Simula o ensemble em lotes no pool e produz (times, acumulador) a cada lote
+    concluído, para que as bandas possam ser exibidas enquanto o ensemble roda.
+    """
+    P = draw_parameters(params, spread, names, n_draws, seed)
+    pool = get_pool()
+    futures = [pool.submit(_simulate_chunk, P[i:i + chunk_size], inits, trange)
+               for i in range(0, n_draws, chunk_size)]
+    accumulator = None
+    for future in as_completed(futures):
+        times, states = future.result()
+        if accumulator is None:
+            accumulator = StreamingQuantiles(states.shape[1:])
+        accumulator.update(states)
+        yield times, accumulator
+
+
+def run_ensemble(params, spread, names, n_draws=200, chunk_size=25, seed=None, inits=None, trange=None,
+                 qs=QUANTILES):
+    """
+    :return: (times, bands) com bands de forma (quantis, dias, 8)
+    """
+    for times, accumulator in iter_ensemble(params, spread, names, n_draws, chunk_size, seed, inits, trange):
+        pass
+    return times, accumulator.quantiles(qs)
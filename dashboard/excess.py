@@ -0,0 +1,125 @@
+"""
+Excesso de mortalidade por estado.
+
+As 27 × 2 séries históricas (`dados/baseline_{UF}.csv.gz` e
+`dados/baseline_{UF}_all_resp.csv.gz`) são lidas uma única vez para um array indexado
+por (tipo, estado, semana). A cada snapshot dos dados, as mortes semanais observadas,
+os quartis históricos e o excesso são calculados para todos os estados de uma vez;
+trocar o estado selecionado passa a ser uma consulta.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import episem
+
+STATES = [
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+    "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO",
+]
+BASELINE_KINDS = ["viral", "all_resp"]
+BASELINE_STATS = ["median", "perc_25", "perc_75"]
+N_WEEKS = 54  # índice = semana epidemiológica (1-53)
+
+BASELINE_DIR = "dashboard/dados"
+
+
+def baseline_path(estado, only_viral=True):
+    if only_viral:
+        return os.path.join(BASELINE_DIR, f"baseline_{estado}.csv.gz")
+    return os.path.join(BASELINE_DIR, f"baseline_{estado}_all_resp.csv.gz")
+
+
+def load_baselines():
+    """
+    Lê todas as séries históricas para um array (tipo, estado, linha, estatística).
+    A linha é a posição no CSV; `weeks` guarda a semana epidemiológica de cada linha.
+    """
+    values = np.full((len(BASELINE_KINDS), len(STATES), N_WEEKS, len(BASELINE_STATS)), np.nan)
+    weeks = np.zeros((len(BASELINE_KINDS), len(STATES), N_WEEKS), dtype=int)
+    for k, kind in enumerate(BASELINE_KINDS):
+        for s, estado in enumerate(STATES):
+            path = baseline_path(estado, only_viral=(kind == "viral"))
+            if not os.path.exists(path):
+                continue
+            df = pd.read_csv(path)
+            n = len(df)
+            values[k, s, :n] = df[BASELINE_STATS].values
+            weeks[k, s, :n] = df["week"].values
+    return values, weeks
+
+
+class ExcessTable:
+    def __init__(self, observed, baselines, baseline_weeks, excess, version=None):
+        self.version = version
+        self.observed = observed
+        self.baselines = baselines
+        self.baseline_weeks = baseline_weeks
+        self.excess = excess
+        self.state_index = {estado: i for i, estado in enumerate(STATES)}
+
+    def baseline(self, estado, only_viral=True):
+        """
+        Série histórica do estado (median, perc_25, perc_75), indexada pela linha do CSV.
+        """
+        k = BASELINE_KINDS.index("viral" if only_viral else "all_resp")
+        values = self.baselines[k, self.state_index[estado]]
+        rows = ~np.isnan(values[:, 0])
+        return pd.DataFrame(values[rows], columns=BASELINE_STATS)
+
+    def observed_deaths(self, estado):
+        """
+        Mortes por COVID-19 por semana epidemiológica, sem a última semana (incompleta).
+        """
+        weekly = self.observed[self.state_index[estado]]
+        weeks = np.flatnonzero(~np.isnan(weekly))
+        return pd.Series(weekly[weeks], index=pd.Index(weeks, name="ew"), name="incidencia")
+
+    def excess_deaths(self, estado, only_viral=True):
+        k = BASELINE_KINDS.index("viral" if only_viral else "all_resp")
+        weekly = self.excess[k, self.state_index[estado]]
+        weeks = np.flatnonzero(~np.isnan(weekly))
+        return pd.Series(weekly[weeks], index=pd.Index(weeks, name="ew"), name="excesso")
+
+
+def weekly_deaths(data):
+    """
+    Mortes semanais por estado a partir das séries acumuladas das linhas estaduais.
+
+    :return: array (estado, semana epidemiológica); NaN nas semanas sem dados
+    """
+    obitos = data.loc[data.place_type == "state", ["state", "date", "Mortes Acumuladas"]]
+    state_codes = pd.Categorical(obitos["state"].astype(str), categories=STATES).codes.astype(np.int64)
+    known = state_codes >= 0
+    dates = obitos["date"].values[known]
+    deaths = obitos["Mortes Acumuladas"].values[known].astype(float)
+    state_codes = state_codes[known]
+
+    order = np.lexsort((dates, state_codes))
+    state_codes, dates, deaths = state_codes[order], dates[order], deaths[order]
+    incidence = np.diff(deaths, prepend=np.nan)
+    incidence[np.r_[True, state_codes[1:] != state_codes[:-1]]] = np.nan
+
+    ew = episem.episem_array(dates)[1]
+    cells = state_codes * N_WEEKS + ew
+    shape = (len(STATES), N_WEEKS)
+    observed = np.bincount(cells, weights=np.nan_to_num(incidence), minlength=np.prod(shape)) \
+        .reshape(shape)
+    present = np.bincount(cells, minlength=np.prod(shape)).reshape(shape) > 0
+    # A última semana de cada estado ainda está incompleta
+    last_week = np.where(present, np.arange(N_WEEKS), -1).max(axis=1)
+    present[np.arange(len(STATES)), last_week] = False
+    observed[~present] = np.nan
+    return observed
+
+
+def build_excess_table(data, baselines, version=None):
+    values, weeks = baselines
+    observed = weekly_deaths(data)
+    # Mediana histórica alinhada por semana epidemiológica
+    median_by_week = np.full((len(BASELINE_KINDS), len(STATES), N_WEEKS), np.nan)
+    k, s, row = np.nonzero(weeks)
+    median_by_week[k, s, weeks[k, s, row]] = values[k, s, row, 0]
+    excess = observed[np.newaxis] - median_by_week
+    return ExcessTable(observed, values, weeks, excess, version=version)
@@ -0,0 +1,150 @@
+"""
+Downloads condicionais e em streaming das fontes de dados remotas.
+
+As requisições enviam If-None-Match/If-Modified-Since com os validadores do último
+download; se a fonte não mudou (304) nada é baixado nem processado. Caso contrário o
+corpo da resposta é descomprimido de forma incremental e passado diretamente ao
+parser, sem manter em memória os bytes comprimidos, descomprimidos e o texto ao mesmo
+tempo.
+
+O transporte é plugável (`set_transport`) para que possa ser substituído, por exemplo,
+por um servidor HTTP local.
+"""
+import gzip
+import hashlib
+import io
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import settings
+
+USER_AGENT = "python-urllib"
+
+# Resultado do último download de cada URL
+stats = {}
+
+
+def urllib_transport(url, headers):
+    """
+    Transporte padrão. Retorna (status, headers da resposta, corpo); o corpo é None
+    quando a fonte não foi modificada.
+    """
+    request = Request(url, headers=headers)
+    try:
+        response = urlopen(request, timeout=settings.FETCH_TIMEOUT)
+    except HTTPError as e:
+        if e.code == 304:
+            return 304, e.headers, None
+        raise
+    return response.status, response.headers, response
+
+
+_transport = urllib_transport
+
+
+def set_transport(transport):
+    global _transport
+    _transport = transport
+
+
+class CountingReader(io.RawIOBase):
+    """
+    Conta os bytes lidos do corpo da resposta e calcula o digest do conteúdo.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.sha1 = hashlib.sha1()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        self.sha1.update(data)
+        return n
+
+
+class FetchResult:
+    def __init__(self, url, status, data, etag, last_modified, digest, bytes_transferred, elapsed):
+        self.url = url
+        self.status = status
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.bytes_transferred = bytes_transferred
+        self.elapsed = elapsed
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+    @property
+    def version(self):
+        """
+        Identificador da versão dos dados: o ETag da fonte ou, na falta dele, o
+        digest do conteúdo baixado.
+        """
+        return self.etag or self.digest
+
+    def as_meta(self):
+        return {
+            "url": self.url,
+            "status": self.status,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "digest": self.digest,
+            "version": self.version,
+            "bytes_transferred": self.bytes_transferred,
+            "elapsed": self.elapsed,
+            "fetched_at": time.time(),
+        }
+
+
+def fetch(url, parse, validators=None, transport=None, compressed=None):
+    """
+    Baixa `url` e entrega o corpo, já descomprimido, a `parse`.
+
+    :param url: endereço da fonte
+    :param parse: função que recebe um arquivo binário e retorna os dados
+    :param validators: dict com `etag` e `last_modified` do download anterior
+    :param transport: substitui o transporte configurado
+    :param compressed: se o corpo é gzip. Por padrão, deduzido da extensão `.gz`
+    :return: FetchResult; `data` é None se a fonte não mudou
+    """
+    validators = validators or {}
+    if compressed is None:
+        compressed = url.endswith(".gz")
+    headers = {"User-Agent": USER_AGENT}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    start = time.perf_counter()
+    status, response_headers, body = (transport or _transport)(url, headers)
+    etag = response_headers.get("ETag") or validators.get("etag")
+    last_modified = response_headers.get("Last-Modified") or validators.get("last_modified")
+    data = None
+    digest = validators.get("digest")
+    bytes_transferred = 0
+    if status != 304:
+        reader = CountingReader(body)
+        stream = gzip.GzipFile(fileobj=reader) if compressed else io.BufferedReader(reader)
+        try:
+            data = parse(stream)
+        finally:
+            body.close()
+        bytes_transferred = reader.bytes_read
+        digest = reader.sha1.hexdigest()
+
+    result = FetchResult(url, status, data, etag, last_modified, digest, bytes_transferred,
+                         time.perf_counter() - start)
+    stats[url] = result.as_meta()
+    return result
@@ -0,0 +1,68 @@
+"""
+Casos confirmados por país (Johns Hopkins CSSE) num array denso (data × país).
+
+A tabela larga do JHU (uma linha por país ou província, uma coluna por data) é
+convertida uma vez por snapshot: as datas são lidas do cabeçalho, as províncias
+somadas ao país e os nomes traduzidos com `nomes-paises.json`. Selecionar países
+passa a ser uma seleção de colunas.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+COUNTRY_NAMES = "dashboard/nomes-paises.json"
+ID_COLUMNS = ["Province/State", "Country/Region", "Lat", "Long"]
+REGION_NAME = "País/Região"
+
+_country_names = None
+
+
+def country_names():
+    """
+    Tradução dos nomes dos países, lida do disco uma vez por processo.
+    """
+    global _country_names
+    if _country_names is None:
+        with open(COUNTRY_NAMES) as f:
+            _country_names = json.load(f)
+    return _country_names
+
+
+class CountryMatrix:
+    def __init__(self, dates, countries, values, version=None):
+        self.version = version
+        self.dates = dates
+        self.countries = countries
+        self.values = values
+        self.country_index = {country: i for i, country in enumerate(countries)}
+
+    def world(self, x_variable="Data", y_variable="Casos"):
+        return pd.DataFrame({x_variable: self.dates, y_variable: self.values.sum(axis=1)})
+
+    def select(self, countries, x_variable="Data", y_variable="Casos"):
+        """
+        Séries dos países escolhidos no formato longo (País/Região, Data, Casos).
+        """
+        columns = [self.country_index[c] for c in countries if c in self.country_index]
+        n_dates = len(self.dates)
+        return pd.DataFrame({
+            REGION_NAME: np.repeat(np.asarray(self.countries, dtype=object)[columns], n_dates),
+            x_variable: np.tile(self.dates.values, len(columns)),
+            y_variable: self.values[:, columns].T.reshape(-1),
+        })
+
+
+def build_country_matrix(global_cases, version=None):
+    """
+    :param global_cases: tabela larga do JHU (time_series_covid19_confirmed_global.csv)
+    """
+    date_columns = [c for c in global_cases.columns if c not in ID_COLUMNS]
+    dates = pd.DatetimeIndex(pd.to_datetime(date_columns, format="%m/%d/%y"))
+    names = country_names()
+    translated = [names.get(c, c) for c in global_cases["Country/Region"].astype(str)]
+    codes, countries = pd.factorize(np.asarray(translated, dtype=object), sort=True)
+    wide = np.nan_to_num(global_cases[date_columns].to_numpy(dtype=np.float64))
+    values = np.zeros((len(countries), len(dates)))
+    np.add.at(values, codes, wide)
+    return CountryMatrix(dates, list(countries), values.T.astype(np.int64), version=version)
@@ -0,0 +1,141 @@
+"""
+Memoização indexada pela versão do snapshot dos dados.
+
+O `st.cache` calcula o hash de todos os argumentos (e do resultado) a cada chamada,
+o que para DataFrames grandes custa mais que a própria computação. Aqui a chave é a
+versão do snapshot (ETag da fonte ou digest do conteúdo, calculado uma única vez no
+download) mais os argumentos leves, com descarte LRU e contadores de acerto, falha e
+descarte.
+
+Objetos pesados entram na chave pela sua versão: o atributo `version` (ex.: cubos de
+agregação) ou `attrs["version"]` para DataFrames devolvidos pelos loaders.
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Todas as caches criadas por `memoize`, por nome da função
+caches = {}
+
+
+class LRUCache:
+    def __init__(self, maxsize=128, name=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+def version_of(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        try:
+            return obj.attrs["version"]
+        except KeyError:
+            raise TypeError("DataFrame sem versão de snapshot não pode ser usado como chave")
+    return obj.version
+
+
+def _key_part(arg):
+    if isinstance(arg, (pd.DataFrame, pd.Series)) or hasattr(arg, "version"):
+        return ("version", version_of(arg))
+    if isinstance(arg, (list, tuple)):
+        return tuple(_key_part(a) for a in arg)
+    if isinstance(arg, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in arg.items()))
+    return arg
+
+
+def make_key(args, kwargs):
+    return tuple(_key_part(a) for a in args) + tuple(sorted((k, _key_part(v)) for k, v in kwargs.items()))
+
+
+_MISSING = object()
+
+
+def memoize(maxsize=128):
+    """
+    Decorador de memoização por versão do snapshot. Os valores devolvidos são
+    compartilhados entre sessões e não devem ser modificados.
+    """
+
+    def decorator(func):
+        cache = LRUCache(maxsize, name=func.__name__)
+        caches[func.__name__] = cache
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        def cached(*args, **kwargs):
+            """
+            Valor em cache para os argumentos, sem calcular; None se ausente.
+            """
+            value = cache.get(make_key(args, kwargs), _MISSING)
+            return None if value is _MISSING else value
+
+        def store(value, *args, **kwargs):
+            """
+            Guarda `value`, calculado fora da função (ex.: com progresso na página),
+            como o resultado para os argumentos.
+            """
+            cache.put(make_key(args, kwargs), value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cached = cached
+        wrapper.store = store
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    return {name: cache.stats() for name, cache in caches.items()}
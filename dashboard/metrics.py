@@ -0,0 +1,178 @@
+"""
+Métricas do dashboard no formato do Prometheus, servidas numa porta própria
+(METRICS_PORT, ou a seguinte livre para cada worker da máquina) para coleta em
+produção:
+
+- tempo de renderização de cada página;
+- acertos, falhas e descartes de cada cache de `memo` e o resultado das
+  atualizações de cada snapshot;
+- bytes e duração dos downloads de cada fonte;
+- idade, linhas e memória dos snapshots e dos DataFrames carregados;
+- tempo de integração do SEQIAHR.
+
+Os contadores das caches, dos snapshots e do atualizador são lidos só no momento da
+coleta. Com METRICS_PORT=0 (padrão) o prometheus_client nem é importado e os pontos
+de medição não fazem nada.
+"""
+import contextlib
+import glob
+import logging
+import os
+import threading
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+ENABLED = settings.METRICS_PORT > 0
+# Limites (s) dos histogramas
+RENDER_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+DOWNLOAD_BUCKETS = (.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SOLVE_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1)
+
+_null = contextlib.nullcontext()
+_server_started = False
+_start_lock = threading.Lock()
+
+if ENABLED:
+    from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+    page_render_seconds = Histogram(
+        "dashboard_page_render_seconds", "Tempo de execução do script por página", ["page"],
+        buckets=RENDER_BUCKETS)
+    ode_solve_seconds = Histogram(
+        "dashboard_seqiahr_solve_seconds", "Tempo de integração do SEQIAHR (falhas da cache)",
+        buckets=SOLVE_BUCKETS)
+    download_seconds = Histogram(
+        "dashboard_download_seconds", "Duração dos downloads de cada fonte", ["source"],
+        buckets=DOWNLOAD_BUCKETS)
+    download_bytes = Counter(
+        "dashboard_download_bytes", "Bytes (comprimidos) recebidos de cada fonte", ["source"])
+    snapshot_refreshes = Counter(
+        "dashboard_snapshot_refreshes", "Atualizações de cada snapshot por resultado",
+        ["snapshot", "result"])
+
+
+def page_render(page):
+    """
+    Mede a renderização de `page` (uma execução do script).
+    """
+    if not ENABLED:
+        return _null
+    return page_render_seconds.labels(page).time()
+
+
+def ode_solve():
+    if not ENABLED:
+        return _null
+    return ode_solve_seconds.time()
+
+
+def observe_fetch(name, result):
+    """
+    Registra um download (ou a resposta "não modificado") do snapshot `name`.
+    """
+    if not ENABLED:
+        return
+    if result.not_modified:
+        snapshot_refreshes.labels(name, "not_modified").inc()
+        return
+    snapshot_refreshes.labels(name, "downloaded").inc()
+    download_seconds.labels(name).observe(result.elapsed)
+    download_bytes.labels(name).inc(result.bytes_transferred)
+
+
+def count_refresh(name, result):
+    """
+    :param result: "skipped" (já verificado por outro processo) ou "error"
+    """
+    if ENABLED:
+        snapshot_refreshes.labels(name, result).inc()
+
+
+class DashboardCollector:
+    """
+    Métricas lidas no momento da coleta: caches de `memo`, snapshots em disco,
+    DataFrames carregados e o atualizador em segundo plano.
+    """
+
+    def collect(self):
+        # Importados aqui: todos já foram carregados pelo dashboard quando há coleta
+        import dashboard_data
+        import memo
+        import refresher
+        import snapshot
+
+        cache_metrics = {
+            field: CounterMetricFamily(f"dashboard_cache_{field}", f"{field} da cache", labels=["cache"])
+            for field in ["hits", "misses", "evictions"]}
+        cache_size = GaugeMetricFamily("dashboard_cache_entries", "Entradas na cache", labels=["cache"])
+        for name, stats in memo.stats().items():
+            for field, family in cache_metrics.items():
+                family.add_metric([name], stats[field])
+            cache_size.add_metric([name], stats["size"])
+        yield from cache_metrics.values()
+        yield cache_size
+
+        age = GaugeMetricFamily("dashboard_snapshot_age_seconds",
+                                "Segundos desde a última verificação da fonte", labels=["snapshot"])
+        rows = GaugeMetricFamily("dashboard_snapshot_rows", "Linhas da versão atual", labels=["snapshot"])
+        size = GaugeMetricFamily("dashboard_snapshot_bytes", "Tamanho em disco da versão atual",
+                                 labels=["snapshot"])
+        for path in glob.glob(os.path.join(settings.SNAPSHOT_DIR, "*.json")):
+            name = os.path.basename(path)[:-len(".json")]
+            meta = snapshot.read_meta(name)
+            file = snapshot.snapshot_path(name, meta)
+            if file is None or not os.path.exists(file):
+                continue
+            age.add_metric([name], snapshot.snapshot_age(name))
+            if meta.get("rows") is not None:
+                rows.add_metric([name], meta["rows"])
+            size.add_metric([name], os.path.getsize(file))
+        yield from [age, rows, size]
+
+        frame_bytes = GaugeMetricFamily("dashboard_frame_bytes",
+                                        "Tamanho do último DataFrame carregado de cada snapshot",
+                                        labels=["snapshot"])
+        for name, nbytes in dashboard_data.frame_memory.items():
+            frame_bytes.add_metric([name], nbytes)
+        yield frame_bytes
+
+        failures = CounterMetricFamily("dashboard_refresher_failures",
+                                       "Falhas do atualizador em segundo plano", labels=["job"])
+        last_success = GaugeMetricFamily("dashboard_refresher_last_success_timestamp_seconds",
+                                         "Última rodada bem-sucedida do atualizador", labels=["job"])
+        for job, status in refresher.status().items():
+            failures.add_metric([job], status["failures"])
+            if status["last_success"] is not None:
+                last_success.add_metric([job], status["last_success"])
+        yield from [failures, last_success]
+
+
+def start(port=settings.METRICS_PORT, workers=settings.METRICS_WORKERS):
+    """
+    Inicia o servidor HTTP das métricas, uma vez por processo. Cada worker da mesma
+    máquina usa a primeira porta livre entre `port` e `port + workers - 1`, e todas
+    essas portas devem estar entre os alvos da coleta; as métricas de cada worker
+    são somadas no Prometheus.
+
+    :return: porta usada, ou None
+    """
+    global _server_started
+    if not ENABLED:
+        return None
+    with _start_lock:
+        if _server_started:
+            return None
+        _server_started = True
+    REGISTRY.register(DashboardCollector())
+    for candidate in range(port, port + workers):
+        try:
+            start_http_server(candidate)
+        except OSError:
+            continue
+        logger.info("Métricas expostas na porta %s", candidate)
+        return candidate
+    logger.warning("Métricas não expostas: nenhuma porta livre entre %s e %s", port, port + workers - 1)
+    return None
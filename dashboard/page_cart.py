@@ -0,0 +1,31 @@
+"""
+Página das mortes registradas em cartório.
+"""
+import streamlit as st
+
+import dashboard_data
+
+TITLE = "Mortes registradas em cartório"
+
+
+def render():
+    st.title(TITLE)
+    x_variable = "date"
+    y_variable = "deaths_covid19"
+    y_variable2 = "Mortes Acumuladas"
+    cart_cube = dashboard_data.get_cart_cube()
+    data_cube = dashboard_data.get_cube()
+    ufs = cart_cube.state_labels
+    uf_option = st.multiselect("Selecione o Estado", ufs)
+    is_log = st.checkbox('Escala Logarítmica', value=False)
+    city_options = None
+    # get data
+    region_name, data_uf = dashboard_data.get_data_cart(cart_cube, uf_option, [y_variable])
+    region_name, data_uf_deaths = dashboard_data.get_data_uf(data_cube, uf_option, city_options, [y_variable2])
+    # Plota mortes dos cartorios
+    fig = dashboard_data.plot_series(data_uf, x_variable, y_variable, region_name, is_log, label='Mortes registradas em Cartório')
+    fig = dashboard_data.add_series(fig, data_uf_deaths, x_variable, y_variable2, region_name, is_log, "Mortes Oficiais")
+
+    st.plotly_chart(fig)
+
+    st.markdown("**Fonte**: [brasil.io](https://brasil.io/dataset/covid19/obito_cartorio)")
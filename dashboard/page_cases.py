@@ -0,0 +1,84 @@
+"""
+Página de casos e mortes no Brasil: séries, métricas derivadas, Rt, letalidade e
+excesso de mortes.
+"""
+import streamlit as st
+
+import dashboard_data
+import derived
+import rt
+
+TITLE = "Casos e Mortes no Brasil"
+
+
+def render():
+    st.title(TITLE)
+    x_variable = "date"
+    y_variable = "Casos Confirmados"
+    y_variable2 = "Mortes Acumuladas"
+
+    data = dashboard_data.get_data()
+    data_cube = dashboard_data.get_cube()
+    ufs = data_cube.state_labels
+    uf_option = st.multiselect("Selecione o Estado", ufs)
+
+    city_options = None
+
+    if uf_option:
+        cities = dashboard_data.get_city_list(data_cube, uf_option)
+        city_options = st.multiselect("Selecione os Municípios", cities)
+
+    is_log = st.checkbox('Escala Logarítmica', value=False)
+    region_name, data_uf = dashboard_data.get_data_uf(data_cube, uf_option, city_options,
+                                                      [y_variable, y_variable2])
+
+    figure = dashboard_data.plot_series(data_uf, x_variable, y_variable, region_name, is_log)
+    figure = dashboard_data.add_series(figure, data_uf, x_variable, y_variable2, region_name, is_log)
+
+    st.plotly_chart(figure)
+
+    st.markdown("## Métricas derivadas")
+    derived_variable = st.selectbox("Selecione a métrica", derived.DERIVED)
+    derived_cube = dashboard_data.get_derived_cube()
+    region_name, derived_uf = dashboard_data.get_data_uf(derived_cube, uf_option, city_options,
+                                                         [derived_variable])
+    st.plotly_chart(dashboard_data.plot_series(derived_uf, x_variable, derived_variable, region_name, is_log))
+
+    st.markdown(r"""## Número de reprodução efetivo ($R_t$)
+Estimado pelo método de Cori et al. a partir dos casos novos, em janelas de 7 dias. A faixa mostra o 
+intervalo de credibilidade de 95%. O intervalo serial é uma distribuição Gama com a média e o desvio padrão abaixo.
+    """)
+    si_mean = st.slider('Intervalo serial, média (dias):', 1.0, 10.0, rt.SERIAL_INTERVAL_MEAN, step=0.1)
+    si_sd = st.slider('Intervalo serial, desvio padrão (dias):', 0.5, 10.0, rt.SERIAL_INTERVAL_SD, step=0.1)
+    rt_cube = dashboard_data.get_rt_cube(si_mean, si_sd, uf_option, city_options)
+    region_name, rt_uf = dashboard_data.get_data_uf(rt_cube, uf_option, city_options, rt.RT_METRICS)
+    figure = dashboard_data.plot_series(rt_uf, x_variable, "Rt", region_name, False)
+    for bound in rt.RT_METRICS[1:]:
+        figure = dashboard_data.add_series(figure, rt_uf, x_variable, bound, region_name, False, label=bound)
+    st.plotly_chart(figure)
+
+    st.markdown("**Fonte**: [brasil.io](https://brasil.io/dataset/covid19/caso)")
+    st.markdown(r"""## Evolução da Letalidade por Estado Brasileiro
+No gráfico abaixo, podemos ver como a letalidade(Fração dos casos confirmados que foi a óbito) está evoluindo 
+com o tempo em cada estado.
+
+É importante lembrar que estes números não representam todas as mortes por COVID-19 no país, pois apenas as mortes de 
+casos testados e confirmados são efetivamente contadas como mortes oficiais pela COVID-19. Devido à escassez de testes e 
+recomendações sobre quem deve ser testado, existe um viés nestas estimativas.
+
+Na figura abaixo o eixo vertical representa a letalidade: $\frac{mortes}{casos}$, o eixo Horizontal representa o número 
+total de casos. O tamanho dos círculos representa o número total de mortes em cada estado. Este gráfico é mais fácil de 
+ser estudado em tela cheia. clicando na legenda é possível "ligar" e "desligar" a visualização dos estados individualmente,
+para facilitar a visualização dos demais. Passando o mouse por sobre os circulos, podemos ler os valores da letalidade e 
+da data a que corresponde.
+    """)
+    animate_cfr = st.checkbox('Animar por data', value=False)
+    dashboard_data.plot_scatter_CFR(data_cube, animate_cfr)
+
+    st.markdown('''## Excesso de Mortes por Estado
+Abaixo, exploramos o excesso de mortalidade nos estados que a COVID-19 representa, quando comparada à média dos 
+últimos 10 anos de mortes por doenças respiratórias.
+    ''')
+    uf_option2 = st.selectbox("Selecione o Estado", ufs)
+    viral = st.checkbox("Apenas Mortalidade por pneumonia viral? Desmarque para comparar com o total de mortes respiratórias", value=True)
+    dashboard_data.plot_excess_deaths(data, uf_option2,viral)
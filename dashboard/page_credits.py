@@ -0,0 +1,10 @@
+"""
+Página da equipe.
+"""
+import streamlit as st
+
+import assets
+
+
+def render():
+    st.markdown(assets.read_text('dashboard/creditos.md'))
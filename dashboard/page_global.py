@@ -0,0 +1,29 @@
+"""
+Página dos casos no mundo (Johns Hopkins CSSE).
+"""
+import streamlit as st
+
+import dashboard_data
+
+TITLE = "Casos no Mundo"
+
+
+def render():
+    st.title(TITLE)
+    x_variable = "Data"
+    y_variable = "Casos"
+    country_matrix = dashboard_data.get_country_matrix()
+    countries = dashboard_data.get_countries_list(country_matrix)
+    countries_options = st.multiselect("Selecione os Países", countries)
+
+    region_name, countries_data = dashboard_data.get_countries_data(
+        country_matrix,
+        countries_options,
+        x_variable,
+        y_variable
+    )
+    is_log = st.checkbox('Escala Logarítmica', value=False)
+
+    fig = dashboard_data.plot_series(countries_data, x_variable, y_variable, region_name, is_log)
+    st.plotly_chart(fig)
+    st.markdown("**Fonte**: [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19)")
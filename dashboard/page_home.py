@@ -0,0 +1,34 @@
+"""
+Página inicial: apresentação e fontes de dados.
+"""
+import streamlit as st
+
+
+def render():
+    st.header("Analisando a Pandemia de COVID-19 no Brasil")
+    st.markdown("""Neste site buscamos trazer até você os números da epidemia, a medida que se revelam, 
+    mas também um olhar analítico, capaz de desvelar a dinâmica do processo de transmissão do vírus SARS-Cov-2
+    por meio de modelos matemáticos, análises estatísticas e visualização de informação.
+    
+Pelo *painel à esquerda* você pode ***navegar entre nossas análises***, as quais estaremos atualizando constantemente 
+daqui para frente. 
+## Outros Recursos de Interesse
+Vamos compilar aqui também outras fontes de informação de confiança para que você possa se manter atualizado 
+com os últimos resultados científicos sobre a Pandemia.
+
+* Canal [A Matemática das Epidemias](https://www.youtube.com/channel/UCZFllLoI5kB4o_6w59YVzAA?view_as=subscriber).
+* Grupo MAVE: [Métodos Analíticos em Vigilância Epidemiológica](https://covid-19.procc.fiocruz.br).
+
+## Fontes de Dados
+As sguintes fontes de dados foram usadas neste projeto:
+
+* [Brasil.io](https://brasil.io): Dados de incidência e mortalidade no Brasil
+* [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19): Dados de incidência e mortalidade globais.
+
+## Softwares opensource
+Várias bibliotecas opensource foram utilizadas na construção deste dashboard:
+
+* [Streamlit](https://streamlit.io): Web framework voltada para ciência de dados.
+* [Epimodels](https://github.com/fccoelho/epimodels): Biblioteca de modelos matemáticos para simulação de epidemias.
+
+    """)
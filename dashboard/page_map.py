@@ -0,0 +1,51 @@
+"""
+Página da distribuição geográfica dos casos (pydeck), por estado.
+"""
+import numpy as np
+import pydeck as pdk
+import streamlit as st
+
+import dashboard_data
+
+
+def render():
+
+    st.title("Distribuição Geográfica de Casos")
+    estados = dashboard_data.get_state_map_data(dashboard_data.get_data())
+
+    midpoint = (np.average(estados["Latitude"]), np.average(estados["Longitude"]))
+
+    layer = pdk.Layer(
+        "ColumnLayer",
+        data=estados,
+        get_position=["Longitude", "Latitude"],
+        get_elevation=['casos'],
+        auto_highlight=True,
+        radius=50000,
+        elevation_scale=300,
+        get_color=[100, 255, 100, 255],
+        pickable=True,
+        extruded=True,
+        coverage=1
+    )
+
+    view_state = pdk.ViewState(
+        longitude=midpoint[1],
+        latitude=midpoint[0],
+        zoom=3,
+        pitch=20.,
+    )
+
+    mapbox_style = 'mapbox://styles/mapbox/light-v9'
+    mapbox_key = 'pk.eyJ1IjoiZmNjb2VsaG8iLCJhIjoiY2s4c293dzc3MGJodzNmcGEweTgxdGpudyJ9.UmSRs3e4EqTOte6jYWoaxg'
+
+    st.write(pdk.Deck(
+        map_style=mapbox_style,
+        mapbox_key=mapbox_key,
+        initial_view_state=view_state,
+        layers=[layer],
+        tooltip={"html": "<b>Estado:</b> {Estados}<br><b>Número de casos:</b> {casos}<br><b>Mortes:</b> {mortes}",
+                 "style": {"color": "white"}},
+    ))
+
+    st.markdown("**Fonte**: [brasil.io](https://brasil.io/dataset/covid19/caso)")
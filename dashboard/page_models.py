@@ -0,0 +1,181 @@
+"""
+Página dos modelos: simulação do SEQIAHR, bandas de incerteza, cenários de quarentena
+e comparação com os dados oficiais.
+"""
+import time
+
+import pandas as pd
+import streamlit as st
+
+import calibration
+import dashboard_data
+import dashboard_models
+import ensemble
+import memo
+import settings
+from dashboard_models import seqiahr_model
+
+COLUMNS = {
+    "A": "Assintomáticos",
+    "S": "Suscetíveis",
+    "E": "Expostos",
+    "I": "Infectados",
+    "H": "Hospitalizados",
+    "R": "Recuperados",
+    "C": "Hospitalizações Acumuladas",
+    "D": "Mortes Acumuladas",
+}
+
+VARIABLES = [
+    'Expostos',
+    'Infectados',
+    'Assintomáticos',
+    'Hospitalizados',
+    'Hospitalizações Acumuladas',
+    "Mortes Acumuladas"
+]
+
+
+def calibrate_with_progress(data_cube, uf, N, fixed, start):
+    """
+    Ajuste de `dashboard_models.calibrate`; se não estiver em cache, é calculado aqui
+    com uma barra de progresso por iteração e o tempo decorrido.
+    """
+    args = (data_cube, uf, N, fixed, start)
+    fit = dashboard_models.calibrate.cached(*args)
+    if fit is not None:
+        return fit
+    progress, status = st.progress(0), st.empty()
+    began = time.perf_counter()
+    for fit in dashboard_models.iter_calibrate(*args):
+        progress.progress(fit['iterations'] / calibration.ITERATIONS)
+        status.text(f"Calibrando {uf or 'Brasil'}: iteração {fit['iterations']} de no máximo "
+                    f"{calibration.ITERATIONS}, {time.perf_counter() - began:.1f} s")
+    progress.empty()
+    status.text(f"Calibração de {uf or 'Brasil'} concluída em {time.perf_counter() - began:.1f} s "
+                f"({fit['iterations']} iterações).")
+    return dashboard_models.calibrate.store(fit, *args)
+
+
+def render():
+    st.title("Explore a dinâmica da COVID-19")
+    st.sidebar.markdown("### Parâmetros do modelo")
+    chi = st.sidebar.slider('χ, Fração de quarentenados', 0.0, 1.0, 0.76)
+    phi = st.sidebar.slider('φ, Taxa de Hospitalização', 0.0, 0.5, 0.005)
+    beta = st.sidebar.slider('β, Taxa de transmissão', 0.0, 1.0, 0.6)
+    rho = st.sidebar.slider('ρ, Taxa de alta dos hospitalizados:', 0.0, 1.0, 0.12)
+    delta = st.sidebar.slider('δ, Taxa de recuperação de Sintomáticos:', 0.0, 1.0, 0.1)
+    gamma = st.sidebar.slider('γ, Taxa de recuperação de Assintomáticos:', 0.0, 1.0, 0.05)
+    alpha = st.sidebar.slider('α, Taxa de incubação', 0.0, 10.0, .37)
+    mu = st.sidebar.slider('μ, Taxa de mortalidade pela COVID-19', 0.0, 1.0, .01)
+
+    p = st.slider('Fração de assintomáticos:', 0.0, 1.0, 0.63)
+    q = st.slider('Dia de início da Quarentena:', 1, 165, 35)
+    r = st.slider('duração em dias da Quarentena:', 0, 200, 80)
+    N = st.number_input('População em Risco:', value=102.3e6, max_value=200e6, step=1e6)
+    st.markdown(f"""$R_0={(beta * (1-chi)*(p*(phi+delta)+(1-p)*gamma)) / (gamma*(delta+phi)):.2f}$, durante a quarentena. &nbsp 
+                $R_0={(beta * (1-0)*(p*(phi+delta)+(1-p)*gamma)) / (gamma*(delta+phi)):.2f}$, fora da quarentena.""")
+
+    params = {
+        'chi': chi,
+        'phi': phi,
+        'beta': beta,
+        'rho': rho,
+        'delta': delta,
+        'gamma': gamma,
+        'alpha': alpha,
+        'mu': mu,
+        'p': p,
+        'q': q,
+        'r': r
+    }
+    model_traces, summary = dashboard_models.normalized_model(params)
+    traces = pd.DataFrame(data=model_traces).rename(columns=COLUMNS)
+    final_traces = dashboard_models.prepare_model_data(traces, VARIABLES, COLUMNS, N)
+    stats = dashboard_models.model_stats(summary, N)
+
+    st.markdown(f"""### Números importantes da simulação""")
+    st.dataframe(stats)
+    st.markdown(f"""O pico das hospitalizações ocorrerá após {summary['dia_pico_hosp']} dias""")
+    st.markdown(f"""O pico das Mortes ocorrerá após {summary['dia_pico_mortes']} dias""")
+
+
+    if settings.SHOW_CACHE_STATS:
+        st.sidebar.markdown("### Cache do modelo")
+        st.sidebar.json(memo.caches['normalized_model'].stats())
+
+    dashboard_models.plot_model(final_traces, q, r)
+    st.markdown('''### Incerteza nas projeções
+Os parâmetros escolhidos são sorteados dentro de uma faixa em torno dos valores acima e o modelo é 
+simulado para cada sorteio. As faixas mostram 50% e 90% das trajetórias simuladas.
+    ''')
+    if st.checkbox('Mostrar bandas de incerteza'):
+        spread = st.slider('Variação dos parâmetros (±%):', 1, 50, 10)
+        uncertain = st.multiselect('Parâmetros incertos:', list(params), default=['beta', 'chi', 'phi', 'mu', 'p'])
+        n_draws = st.number_input('Número de simulações:', value=200, min_value=50, max_value=2000, step=50)
+        band_variable = st.selectbox('Variável das bandas:', VARIABLES, index=VARIABLES.index('Hospitalizados'))
+        args = (params, spread / 100, uncertain, int(n_draws))
+        result = dashboard_models.seqiahr_ensemble.cached(*args)
+        if result is None:
+            progress = st.progress(0)
+            for times, accumulator in ensemble.iter_ensemble(*args, seed=0):
+                progress.progress(accumulator.n / n_draws)
+            progress.empty()
+            result = dashboard_models.seqiahr_ensemble.store(
+                (times, accumulator.quantiles(ensemble.QUANTILES)), *args)
+        times, bands = result
+        state_variable = {v: k for k, v in COLUMNS.items()}[band_variable]
+        dashboard_models.plot_model_bands(times, bands, state_variable, N)
+    st.markdown('''### Comparando cenários de quarentena
+Escolha outros dias de início da quarentena para comparar com o cenário acima.
+    ''')
+    q_options = st.multiselect('Dias de início da Quarentena:', list(range(5, 166, 5)), default=[20, 50])
+    scenario_variable = st.selectbox('Variável:', VARIABLES, index=VARIABLES.index('Hospitalizados'))
+    q_values = sorted(set([q] + q_options))
+    scenario_traces = dashboard_models.seqiahr_scenarios(params, 'q', q_values)
+    scenario_data = dashboard_models.prepare_scenario_data(
+        scenario_traces, [f'Quarentena no dia {v}' for v in q_values], scenario_variable, COLUMNS, N)
+    dashboard_models.plot_scenarios(scenario_data, scenario_variable)
+    st.markdown('''### Comparando Projeções e Dados
+Podemos agora comparar nossa série simulada de Hospitalizações acumuladas com o número de casos acumulados 
+de notificações oficiais.
+    ''')
+    if st.checkbox('Calibrar o modelo aos dados oficiais'):
+        st.markdown('β, χ, φ, μ e o atraso da notificação são ajustados às séries de casos e mortes da região '
+                    'escolhida; os demais parâmetros são os da barra lateral.')
+        data_cube = dashboard_data.get_cube()
+        region = st.selectbox('Região:', ['Brasil'] + data_cube.state_labels)
+        uf = False if region == 'Brasil' else region
+        fixed = {k: v for k, v in params.items() if k not in calibration.FIT_PARAMETERS}
+        # Os estados partem do ajuste do Brasil, que só depende dos dados e da barra lateral
+        fit = calibrate_with_progress(data_cube, False, N, fixed, None)
+        if uf:
+            fit = calibrate_with_progress(data_cube, uf, N, fixed, fit['params'])
+        st.dataframe(pd.DataFrame({k: [fit['params'][k]] for k in calibration.FIT_PARAMETERS},
+                                  index=['Ajuste']).assign(atraso=fit['offset']))
+        fitted_traces = dashboard_models.prepare_model_data(
+            pd.DataFrame(data=seqiahr_model(params=fit['params'])).rename(columns=COLUMNS), VARIABLES, COLUMNS, N)
+        dashboard_models.plot_predictions(fit['offset'], fitted_traces, dias=365, uf=uf)
+    else:
+        ofs = st.number_input("Atraso no início da notificação (dias)", value=0, min_value=0, max_value=90, step=1)
+        st.markdown('Na caixa acima, você pode mover lateralmente a curva, Assumindo que os primeiro caso '
+                    'notificado não corresponde ao início da transmissão')
+        dashboard_models.plot_predictions(ofs, final_traces, dias=365)
+    st.markdown('### Formulação do modelo')
+    st.write(r"""
+            $\frac{dS}{dt}=-\lambda[(1-\chi) S]$
+
+            $\frac{dE}{dt}= \lambda [(1-\chi) S] -\alpha E$
+
+            $\frac{dI}{dt}= (1-p)\alpha E - \delta I -\phi I$
+
+            $\frac{dA}{dt}= p\alpha E - \gamma A$
+
+            $\frac{dH}{dt}= \phi I -(\rho+\mu) H$
+
+            $\frac{dR}{dt}= \delta I + \rho H+\gamma A$
+
+            $\lambda=\beta(I+A)$
+
+            $\mathcal{R}_0 = \frac{\beta(1-\chi)( p (\phi + \delta) +(1-p)\gamma)}{\gamma(\delta + \phi)}$
+            """)
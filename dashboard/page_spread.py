@@ -0,0 +1,23 @@
+"""
+Página da probabilidade de espalhamento da epidemia pelos municípios.
+"""
+import streamlit as st
+
+import assets
+
+
+def render():
+    st.title('Probabilidade de Epidemia por Município ao Longo do tempo')
+
+    st.video(assets.read_bytes('dashboard/video_prob.mp4'))
+    st.markdown(r'''## Descrição da modelagem:
+Os municípios brasileiros são conectados por uma malha de transporte muito bem desenvolvida e através desta,
+cidadãs e cidadãos viajam diariamente entre as cidades para trabalhar, estudar e realizar outras atividades.
+Considerando o fluxo de indivíduos (infectados) que chega em um município em um determinado dia, caso este município
+ainda não estejam em transmissão comunitária, podemos calcular a probabilidade de uma epidemia se estabelecer.
+Esta probabilidade é dada por esta fórmula:
+
+$$P_{epi}=1-\left(\frac{1}{R_0}\right)^{I_0}$$,
+
+onde $I_0$ é o número de infectados chegando diáriamente no município. Neste cenário usamos um $R_0=2.5$.
+    ''')
@@ -0,0 +1,149 @@
+"""
+Perfil de uma execução do script (rerun), para investigar páginas lentas em produção.
+
+Ligado para todas as execuções com PROFILE=1 (ou PROFILE=cprofile). Com
+PROFILE_ALLOW_QUERY=1, também pode ser ligado só para uma execução com o parâmetro
+`?profile=1` (ou `?profile=cprofile`) na URL; sem essa configuração o parâmetro é
+ignorado, para que visitantes não gravem perfis no servidor. Desligado, custa a
+verificação dessas configurações (e a consulta aos parâmetros da URL, se permitida).
+
+- `sample` (padrão): uma thread amostra a pilha da execução a cada PROFILE_INTERVAL
+  segundos e grava as pilhas no formato "folded" (`página;função;função N`), lido
+  por flamegraph.pl, speedscope e inferno;
+- `cprofile`: perfil determinístico do cProfile, gravado no formato do pstats
+  (snakeviz, gprof2dot, flameprof).
+
+Os arquivos vão para PROFILE_DIR, com a data e a página no nome, e o caminho é
+registrado no log do servidor; só os PROFILE_KEEP mais recentes são mantidos.
+"""
+import collections
+import contextlib
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+import streamlit as st
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ["sample", "cprofile"]
+
+_null = contextlib.nullcontext()
+
+
+def _mode(value):
+    if value in ("", "0"):
+        return None
+    return value if value in MODES else "sample"
+
+
+def requested_mode():
+    """
+    Modo pedido para esta execução (variável de ambiente ou parâmetro da URL), ou None.
+    """
+    mode = _mode(settings.PROFILE)
+    if mode is None and settings.PROFILE_ALLOW_QUERY:
+        mode = _mode(st.experimental_get_query_params().get("profile", [""])[0])
+    return mode
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # ";" separa as funções no formato folded
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Sampler:
+    """
+    Amostra a pilha da thread `thread_id` a partir do frame `root`, contando as
+    pilhas iguais.
+    """
+
+    def __init__(self, thread_id, root, interval=settings.PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                if frame is self.root:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self, prefix):
+        return "".join(f"{';'.join((prefix,) + stack)} {count}\n" for stack, count in self.stacks.items())
+
+
+def _output_path(page, extension):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w]+", "-", page).strip("-").lower()
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{threading.get_ident()}-{slug}.{extension}"
+    return os.path.join(settings.PROFILE_DIR, name)
+
+
+def _remove_old_profiles(keep=settings.PROFILE_KEEP):
+    files = sorted(os.listdir(settings.PROFILE_DIR))
+    for file in files[:-keep] if keep > 0 else files:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, file))
+        except FileNotFoundError:
+            pass
+
+
+@contextlib.contextmanager
+def _profile(page, mode, root):
+    start = time.perf_counter()
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = _output_path(page, "prof")
+            profiler.dump_stats(path)
+    else:
+        sampler = Sampler(threading.get_ident(), root)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = _output_path(page, "folded")
+            with open(path, "w") as f:
+                f.write(sampler.folded(f"página: {page}".replace(";", ",")))
+    _remove_old_profiles()
+    logger.info("Perfil de %s (%.2f s) gravado em %s", page, time.perf_counter() - start, path)
+
+
+def rerun(page):
+    """
+    Perfil da execução de `page`, se pedido; caso contrário, um contexto vazio.
+    """
+    mode = requested_mode()
+    if mode is None:
+        return _null
+    # As pilhas amostradas começam na função que abriu o contexto
+    return _profile(page, mode, sys._getframe(1))
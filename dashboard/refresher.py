@@ -0,0 +1,128 @@
+"""
+Atualização dos snapshots em segundo plano.
+
+Uma thread do processo baixa novamente cada fonte a intervalos regulares (antes do
+CACHE_TTL expirar) e reconstrói as tabelas derivadas fora do caminho das requisições.
+Atualizações simultâneas do mesmo snapshot, vindas da thread ou de uma página, são
+reunidas numa só (`single_flight`): quem chega depois espera o resultado da que está
+em andamento. Se uma atualização falha, o último snapshot válido continua sendo
+servido.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Executa `func` para `key`, ou espera e devolve o resultado da execução já em
+        andamento para a mesma chave.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+        if not owner:
+            call.done.wait()
+        else:
+            try:
+                call.result = func()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+flights = SingleFlight()
+
+
+class Refresher:
+    def __init__(self, jobs, interval):
+        """
+        :param jobs: dict nome -> função sem argumentos que atualiza a fonte e aquece
+            as tabelas derivadas
+        :param interval: segundos entre duas rodadas
+        """
+        self.jobs = jobs
+        self.interval = interval
+        self.status = {name: {"runs": 0, "failures": 0, "last_success": None, "last_error": None,
+                              "duration": None} for name in jobs}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        for name, job in self.jobs.items():
+            status = self.status[name]
+            start = time.time()
+            try:
+                job()
+            except Exception as e:
+                status["failures"] += 1
+                status["last_error"] = f"{type(e).__name__}: {e}"
+                logger.exception("Falha ao atualizar %s; mantendo o último snapshot", name)
+            else:
+                status["last_success"] = time.time()
+            status["runs"] += 1
+            status["duration"] = time.time() - start
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="snapshot-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+_refresher = None
+
+
+def start(jobs, interval):
+    """
+    Inicia o atualizador do processo; chamadas seguintes (novas execuções do script
+    do Streamlit) reaproveitam o mesmo.
+    """
+    global _refresher
+    if _refresher is None:
+        _refresher = Refresher(jobs, interval)
+    _refresher.start()
+    return _refresher
+
+
+def is_running():
+    return _refresher is not None and _refresher.running
+
+
+def status():
+    return dict(_refresher.status) if _refresher is not None else {}
@@ -0,0 +1,98 @@
+"""
+Número de reprodução efetivo (Rt) pelo método de Cori et al. (2013).
+
+A incidência diária de todas as regiões (país, estados e municípios) é tratada como
+um único array (datas × regiões). A infecciosidade total é a convolução da incidência
+com a distribuição do intervalo serial, e as somas em janelas móveis de incidência e
+infecciosidade saem de somas acumuladas. Com a priori Gama(a, b), a posteriori de Rt
+em cada janela é Gama(a + ΣI, 1 / (1/b + ΣΛ)), de onde vêm a média e o intervalo de
+credibilidade.
+"""
+import numpy as np
+
+import cube
+import derived
+
+SERIAL_INTERVAL_MEAN = 4.7  # dias
+SERIAL_INTERVAL_SD = 2.9
+WINDOW = 7
+PRIOR_SHAPE = 1.
+PRIOR_SCALE = 5.
+# Soma mínima de casos na janela para que a estimativa seja mostrada
+MIN_CASES = 12
+QUANTILES = (.025, .975)
+RT_METRICS = ["Rt", "Rt (2,5%)", "Rt (97,5%)"]
+
+
+def serial_interval(mean=SERIAL_INTERVAL_MEAN, sd=SERIAL_INTERVAL_SD, max_days=None):
+    """
+    Intervalo serial Gama discretizado por dia.
+
+    :return: array w com w[s - 1] a probabilidade de um intervalo de s dias
+    """
+    # scipy.stats é importado só no cálculo: o módulo é usado pelo dashboard_data
+    # em todas as páginas
+    from scipy import stats
+
+    shape = (mean / sd) ** 2
+    scale = sd ** 2 / mean
+    if max_days is None:
+        max_days = int(np.ceil(stats.gamma.ppf(.999, shape, scale=scale)))
+    w = np.diff(stats.gamma.cdf(np.arange(max_days + 1), shape, scale=scale))
+    return w / w.sum()
+
+
+def infectiousness(incidence, w):
+    """
+    Λ_t = Σ_s w_s I_{t-s}, para todas as regiões (colunas) de uma vez.
+    """
+    total = np.zeros(incidence.shape)
+    for s, weight in enumerate(w[:len(incidence) - 1], start=1):
+        total[s:] += weight * incidence[:-s]
+    return total
+
+
+def estimate(incidence, w, window=WINDOW, prior_shape=PRIOR_SHAPE, prior_scale=PRIOR_SCALE,
+             quantiles=QUANTILES, min_cases=MIN_CASES):
+    """
+    Rt de cada região e dia, estimado na janela de `window` dias terminada no dia.
+
+    :param incidence: array (datas × regiões) de casos novos; NaN antes do início da
+        série de cada região
+    :return: array (datas × regiões × (1 + len(quantiles))) com a média a posteriori e
+        os quantis pedidos; NaN onde não há casos suficientes
+    """
+    from scipy import stats
+
+    present = ~np.isnan(incidence)
+    # Correções da série (casos novos negativos) não entram na estimativa
+    incidence = np.clip(np.nan_to_num(incidence), 0, None)
+    total = infectiousness(incidence, w)
+    cases = derived.window_sums(incidence, window)[1:]
+    infectious = derived.window_sums(total, window)[1:]
+
+    valid = present & (cases >= min_cases) & (infectious > 0)
+    valid[:window] = False
+    shape = prior_shape + cases[valid]
+    scale = 1 / (1 / prior_scale + infectious[valid])
+
+    result = np.full(incidence.shape + (1 + len(quantiles),), np.nan)
+    result[valid, 0] = shape * scale
+    for k, q in enumerate(quantiles, start=1):
+        result[valid, k] = stats.gamma.ppf(q, shape, scale=scale)
+    return result
+
+
+def build_rt_cube(derived_cube, mean=SERIAL_INTERVAL_MEAN, sd=SERIAL_INTERVAL_SD, window=WINDOW):
+    """
+    Cubo com Rt e seu intervalo de credibilidade (RT_METRICS) para todas as regiões do
+    cubo de métricas derivadas.
+    """
+    w = serial_interval(mean, sd)
+    new_cases = derived_cube.metrics.index("Novos Casos")
+    national = estimate(derived_cube.national[:, new_cases, np.newaxis], w, window)[:, 0]
+    states = estimate(derived_cube.states[:, :, new_cases], w, window)
+    cities = estimate(derived_cube.cities[:, :, new_cases].astype(np.float64), w, window).astype(np.float32)
+    return cube.AggregationCube(derived_cube.dates, RT_METRICS, national, states, derived_cube.state_labels,
+                                cities, derived_cube.city_labels,
+                                version=(derived_cube.version, "rt", mean, sd, window))
@@ -0,0 +1,120 @@
+"""
+Integrador em lote do modelo SEQIAHR.
+
+Avança muitos conjuntos de parâmetros ao mesmo tempo, com o estado guardado num array
+(8 compartimentos × cenários) integrado numa única chamada ao solve_ivp. O lado
+direito é o mesmo do `SEQIAHR` do epimodels, incluindo a janela de quarentena
+definida por `q` (dia de início) e `r` (duração).
+"""
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+
+STATE_VARIABLES = ["S", "E", "I", "A", "H", "R", "C", "D"]
+PARAMETERS = ["chi", "phi", "beta", "rho", "delta", "gamma", "alpha", "mu", "p", "q", "r"]
+
+INITS = [.99, 0, 1e-6, 0, 0, 0, 0, 0]
+TRANGE = [0, 365]
+# Tolerâncias do solve_ivp para qualquer número de cenários: em lote o controle de
+# erro é feito sobre o vetor conjunto, e um cenário integrado sozinho precisa dar o
+# mesmo resultado que integrado junto com outros
+TOLERANCES = {"rtol": 1e-6, "atol": 1e-9}
+
+
+def param_matrix(params):
+    """
+    Converte um dict de parâmetros, uma lista de dicts ou um DataFrame com as colunas
+    de PARAMETERS num array (cenários × parâmetros). Arrays são usados como estão.
+    """
+    if isinstance(params, np.ndarray):
+        return params.astype(float)
+    if isinstance(params, dict):
+        params = [params]
+    if isinstance(params, pd.DataFrame):
+        return params[PARAMETERS].to_numpy(dtype=float)
+    return np.array([[p[name] for name in PARAMETERS] for p in params], dtype=float)
+
+
+def quarantine(t, q, r):
+    """
+    Fator que liga a quarentena no dia q e a desliga no dia q + r.
+    """
+    return ((1 + np.tanh(t - q)) / 2) * ((1 - np.tanh(t - (q + r))) / 2)
+
+
+def rhs(t, y, P):
+    """
+    Lado direito do SEQIAHR para todos os cenários.
+
+    :param y: array (8, cenários)
+    :param P: array (parâmetros, cenários)
+    """
+    S, E, I, A, H, R, C, D = y
+    chi, phi, beta, rho, delta, gamma, alpha, mu, p, q, r = P
+    out = np.empty_like(y)
+    chi = chi * quarantine(t, q, r)
+    infection = beta * (I + A) * (1 - chi) * S
+    incubation = alpha * E
+    hospitalization = phi * I
+    out[0] = -infection
+    out[1] = infection - incubation
+    out[2] = (1 - p) * incubation - delta * I - hospitalization
+    out[3] = p * incubation - gamma * A
+    out[4] = hospitalization - (rho + mu) * H
+    out[5] = delta * I + rho * H + gamma * A
+    out[6] = hospitalization
+    out[7] = mu * H
+    return out
+
+
+def simulate(params, inits=None, trange=None, method="RK45", **kwargs):
+    """
+    Integra todos os cenários de uma vez.
+
+    :param params: ver `param_matrix`
+    :param inits: condições iniciais (8 valores, iguais para todos os cenários, ou um
+        array cenários × 8)
+    :param trange: [t0, tf]; a saída tem um ponto por dia em range(t0, tf)
+    :param method: método do solve_ivp. O padrão é o mesmo do epimodels
+    :param kwargs: repassados ao solve_ivp (ex.: rtol, atol); o padrão de rtol e atol
+        é TOLERANCES, com um ou vários cenários
+    :return: (times, states) com states de forma (cenários, dias, 8), em frações da
+        população
+    """
+    P = param_matrix(params).T
+    n = P.shape[1]
+    if inits is None:
+        inits = INITS
+    if trange is None:
+        trange = TRANGE
+    inits = np.asarray(inits, dtype=float)
+    if inits.ndim == 1:
+        inits = np.broadcast_to(inits, (n, len(STATE_VARIABLES)))
+    y0 = inits.T.ravel()
+    shape = (len(STATE_VARIABLES), n)
+
+    def fun(t, y):
+        return rhs(t, y.reshape(shape), P).ravel()
+
+    kwargs = dict(TOLERANCES, **kwargs)
+    times = np.arange(trange[0], trange[1])
+    sol = solve_ivp(fun, trange, y0, method, t_eval=times, **kwargs)
+    # sol.y: (8 * cenários, dias) -> (cenários, dias, 8)
+    return sol.t, sol.y.reshape(len(STATE_VARIABLES), n, -1).transpose(1, 2, 0)
+
+
+def as_traces(times, states, scenario=0):
+    """
+    Traces de um cenário no formato de `SEQIAHR.traces` do epimodels.
+    """
+    traces = {v: states[scenario, :, i] for i, v in enumerate(STATE_VARIABLES)}
+    traces["time"] = times
+    return traces
+
+
+def scenarios(params, name, values):
+    """
+    Variações de `params` com o parâmetro `name` assumindo cada um de `values`
+    (ex.: dia de início da quarentena 20, 35 e 50).
+    """
+    return [dict(params, **{name: value}) for value in values]
@@ -2,3 +2,21 @@ import os
 
 
 CACHE_TTL = int(os.environ.get("CACHE_TTL", 3600)) # 1h
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "dashboard/snapshots")
+FETCH_TIMEOUT = int(os.environ.get("FETCH_TIMEOUT", 300))
+SHOW_CACHE_STATS = os.environ.get("SHOW_CACHE_STATS", "") not in ("", "0")
+BACKGROUND_REFRESH = os.environ.get("BACKGROUND_REFRESH", "1") not in ("", "0")
+REFRESH_INTERVAL = int(os.environ.get("REFRESH_INTERVAL", CACHE_TTL // 2))
+# Versões antigas de cada snapshot mantidas em disco além da atual
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", 2))
+# Porta do endpoint de métricas do Prometheus; 0 desliga as métricas
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+# Portas reservadas às métricas a partir de METRICS_PORT, uma por worker da máquina
+METRICS_WORKERS = int(os.environ.get("METRICS_WORKERS", 8))
+# Perfil das execuções do script: "" (desligado), "1"/"sample" ou "cprofile"
+PROFILE = os.environ.get("PROFILE", "")
+# Permite ligar o perfil de uma execução pelo parâmetro `?profile=` da URL
+PROFILE_ALLOW_QUERY = os.environ.get("PROFILE_ALLOW_QUERY", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "dashboard/profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", .005))  # segundos entre amostras
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 50))
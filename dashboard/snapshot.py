@@ -0,0 +1,234 @@
+"""
+Armazenamento local, em formato colunar (Feather/Arrow IPC), dos dados baixados.
+
+Cada download é convertido uma única vez para um arquivo tipado: colunas de texto
+como categóricas, contagens como int32 e `date` como datetime.
+
+Os arquivos são imutáveis e versionados (`<SNAPSHOT_DIR>/<nome>/<versão>.feather`);
+`<nome>.json` aponta para a versão atual e é trocado atomicamente. Todos os processos
+que usam o mesmo SNAPSHOT_DIR (vários workers numa máquina, ou um volume
+compartilhado) leem os mesmos arquivos por memory-map somente leitura, de modo que as
+colunas numéricas ficam no cache de páginas do sistema e não são copiadas para a
+memória de cada processo. As atualizações são coordenadas por um arquivo de lock
+(`<nome>.lock`): só um processo baixa e grava cada versão, e os demais passam a usá-la.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow.feather as feather
+
+import settings
+
+CATEGORICAL_COLUMNS = ["state", "city", "place_type"]
+COUNT_COLUMNS = [
+    "Casos Confirmados",
+    "Mortes Acumuladas",
+    "new_confirmed",
+    "new_deaths",
+    "order_for_place",
+    "epidemiological_week",
+    "deaths_covid19",
+]
+
+
+class SnapshotLock:
+    """
+    Lock do snapshot entre threads e processos: um RLock do processo e um `flock`
+    exclusivo em `<nome>.lock`, tomado só na entrada mais externa (o flock não é
+    reentrante dentro do mesmo processo).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+                self._file = open(lock_path(self.name), "a")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def lock(name):
+    """
+    Lock de atualização do snapshot `name`, compartilhado por todos os processos que
+    usam o mesmo SNAPSHOT_DIR. Leitores não precisam dele: os arquivos de cada versão
+    nunca são reescritos.
+    """
+    with _locks_guard:
+        if name not in _locks:
+            _locks[name] = SnapshotLock(name)
+        return _locks[name]
+
+
+def lock_path(name):
+    return os.path.join(settings.SNAPSHOT_DIR, f"{name}.lock")
+
+
+def version_dir(name):
+    return os.path.join(settings.SNAPSHOT_DIR, name)
+
+
+def snapshot_path(name, meta=None):
+    """
+    Arquivo da versão descrita por `meta` (por padrão, a versão atual), ou None se
+    não há nenhuma.
+    """
+    if meta is None:
+        meta = read_meta(name)
+    if not meta.get("file"):
+        return None
+    return os.path.join(version_dir(name), meta["file"])
+
+
+def meta_path(name):
+    return os.path.join(settings.SNAPSHOT_DIR, f"{name}.json")
+
+
+def exists(name):
+    path = snapshot_path(name)
+    return path is not None and os.path.exists(path)
+
+
+def snapshot_age(name):
+    """
+    Segundos desde a última verificação da fonte do snapshot `name` (download ou
+    resposta "não modificado"), ou None se ele ainda não existe.
+    """
+    meta = read_meta(name)
+    if not meta.get("file"):
+        return None
+    return time.time() - meta.get("checked_at", 0)
+
+
+def is_fresh(name, ttl=settings.CACHE_TTL):
+    age = snapshot_age(name)
+    return age is not None and age < ttl
+
+
+def normalize_types(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in COUNT_COLUMNS:
+        # Colunas com valores ausentes continuam como float
+        if col in df.columns and not df[col].hasnans:
+            df[col] = df[col].astype("int32")
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def write_snapshot(name, df, meta=None):
+    """
+    Grava `df` como uma nova versão imutável do snapshot `name` e passa a apontar
+    para ela. A troca é atômica: os leitores veem a versão anterior ou a nova, nunca
+    um arquivo pela metade. Deve ser chamada sob `lock(name)`.
+
+    :param meta: metadados do download, guardados com a versão
+    :return: metadados gravados
+    """
+    os.makedirs(version_dir(name), exist_ok=True)
+    # Prefixo de data para que as versões fiquem em ordem de criação
+    file = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.feather"
+    path = os.path.join(version_dir(name), file)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    # Sem compressão, para que a leitura possa ser feita por memory-map
+    feather.write_feather(normalize_types(df).reset_index(drop=True), tmp_path,
+                          compression="uncompressed")
+    os.replace(tmp_path, path)
+    meta = dict(meta or {}, file=file, columns=list(df.columns), rows=len(df), checked_at=time.time())
+    write_meta(name, meta)
+    remove_old_versions(name)
+    return meta
+
+
+def remove_old_versions(name, keep=settings.SNAPSHOT_KEEP):
+    """
+    Apaga as versões mais antigas, mantendo a atual e as `keep` mais recentes.
+    Processos que ainda leem uma versão apagada continuam com o memory-map válido
+    até soltá-lo.
+    """
+    current = read_meta(name).get("file")
+    files = sorted(f for f in os.listdir(version_dir(name)) if f.endswith(".feather"))
+    for file in files[:-(keep + 1)]:
+        if file != current:
+            try:
+                os.remove(os.path.join(version_dir(name), file))
+            except FileNotFoundError:
+                pass
+
+
+def read_snapshot(name, columns=None, meta=None):
+    """
+    Lê a versão descrita por `meta` (por padrão, a atual) por memory-map. As colunas
+    numéricas do DataFrame apontam diretamente para o arquivo mapeado (somente
+    leitura), sem cópia; só as categóricas de texto são materializadas.
+    """
+    table = feather.read_table(snapshot_path(name, meta), columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def touch(name, meta=None):
+    """
+    Marca o snapshot como verificado sem gravar uma nova versão (fonte não
+    modificada), atualizando os metadados com `meta`. Deve ser chamada sob
+    `lock(name)`.
+    """
+    meta = dict(read_meta(name), **(meta or {}), checked_at=time.time())
+    write_meta(name, meta)
+    return meta
+
+
+def read_meta(name):
+    """
+    Metadados da versão atual: arquivo, colunas, momento da última verificação e os
+    do download que a gerou (ETag, Last-Modified, bytes, tempo).
+    """
+    try:
+        with open(meta_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_meta(name, meta):
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+    path = meta_path(name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def version(name):
+    return read_meta(name).get("version")
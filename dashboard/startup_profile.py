@@ -0,0 +1,83 @@
+"""
+Perfil de inicialização do dashboard, página a página.
+
+Cada página é aberta num processo novo (imports a frio), que mede o tempo para
+importar o script principal, o do módulo da página e o da primeira renderização, e
+os pacotes importados em cada fase que mais custaram (`python -X importtime`). As
+chamadas do Streamlit rodam fora do `streamlit run`, sem exibir nada; os dados vêm
+dos snapshots locais ou são baixados, como na primeira visita de um usuário.
+Deve ser executado da raiz do repositório.
+
+Uso: python dashboard/startup_profile.py [página ...]
+"""
+import json
+import os
+import subprocess
+import sys
+
+DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_IMPORTS = 5
+
+# Executado em cada processo filho; as marcas em stderr separam as fases na saída
+# do -X importtime
+CHILD = """
+import importlib, json, sys, time
+sys.path.insert(0, {dashboard_dir!r})
+start = time.perf_counter()
+import Covid19
+router = time.perf_counter()
+sys.stderr.write("@@ page\\n")
+module = importlib.import_module(Covid19.PAGES[sys.argv[1]])
+imported = time.perf_counter()
+sys.stderr.write("@@ render\\n")
+error = None
+try:
+    module.render()
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+rendered = time.perf_counter()
+sys.stderr.write("@@ end\\n")
+print(json.dumps({{"router": round(router - start, 3), "page_import": round(imported - router, 3),
+                  "first_render": round(rendered - imported, 3), "error": error}}))
+"""
+
+
+def heaviest_imports(importtime, top=TOP_IMPORTS):
+    """
+    Pacotes cujos módulos mais custaram a importar (soma dos tempos próprios, em
+    segundos) em cada fase da saída do -X importtime.
+    """
+    phases, phase = {"router": {}}, "router"
+    for line in importtime.splitlines():
+        if line.startswith("@@ "):
+            phase = line[3:]
+            phases.setdefault(phase, {})
+            continue
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            phases[phase][package] = phases[phase].get(package, 0) + int(own) / 1e6
+    return {phase: [(package, round(seconds, 3)) for package, seconds in
+                    sorted(found.items(), key=lambda item: -item[1])[:top]]
+            for phase, found in phases.items() if phase != "end"}
+
+
+def profile_page(page):
+    env = dict(os.environ, BACKGROUND_REFRESH="0")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(dashboard_dir=DASHBOARD_DIR), page],
+        capture_output=True, text=True, env=env)
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1:]}
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["imports"] = heaviest_imports(process.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, DASHBOARD_DIR)
+    from Covid19 import PAGES
+    for page in sys.argv[1:] or list(PAGES):
+        print(page, profile_page(page))
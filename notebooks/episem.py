@@ -101,6 +101,39 @@ def episem(x, sep='W', out='YW'):
     return(out_format(epiyear, epiweek, out))
 
 
+# Primeiro dia epidemiológico de cada ano em FIRST_EPIDAYS_YEARS, usado por episem_array
+FIRST_EPIDAYS_YEARS = (1900, 2201)
+FIRST_EPIDAYS = np.array([firstepiday(y) for y in range(*FIRST_EPIDAYS_YEARS)], dtype='datetime64[ns]')
+
+
+def episem_array(x):
+
+    """
+    Vectorized version of episem for arrays of dates.
+
+    :param x: Input dates. numpy datetime64 array, pandas Series or DatetimeIndex.
+    :return: tuple (epiyear, epiweek) of int arrays
+    """
+
+    x = np.asarray(x, dtype='datetime64[ns]')
+    year = x.astype('datetime64[Y]').astype(int) + 1970
+    if year.size and (year.min() <= FIRST_EPIDAYS_YEARS[0] or year.max() >= FIRST_EPIDAYS_YEARS[1] - 1):
+        raise ValueError('Dates must be within years %s-%s' % (FIRST_EPIDAYS_YEARS[0] + 1, FIRST_EPIDAYS_YEARS[1] - 2))
+
+    idx = year - FIRST_EPIDAYS_YEARS[0]
+    # Same comparisons as episem(): after the last epiday of the year means week 1 of the next one,
+    # before the first epiday means the previous year
+    epiend = FIRST_EPIDAYS[idx + 1] - np.timedelta64(1, 'D')
+    after_end = x > epiend
+    before_start = x < FIRST_EPIDAYS[idx]
+    epiyear = year + after_end - (before_start & ~after_end)
+    epistart = FIRST_EPIDAYS[epiyear - FIRST_EPIDAYS_YEARS[0]]
+    epiweek = (x - epistart) // np.timedelta64(7, 'D') + 1
+    epiweek[after_end] = 1
+
+    return epiyear.astype(int), epiweek.astype(int)
+
+
 def lastepiweek(year):
     # Calculate number of year's last week
 
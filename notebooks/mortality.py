@@ -1,10 +1,10 @@
 import pandas as pd
 import numpy as np
 import datetime
+import logging
 from pysus.online_data.SIM import download
 from pysus.online_data import cache_contents
-from pysus.preprocessing.decoders import decodifica_idade_SIM
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import plotly.express as px
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -13,7 +13,12 @@ import matplotlib
 from functools import lru_cache
 import os
 
+logger = logging.getLogger(__name__)
+
 YEARS = range(2009, 2019)
+SIM_COLUMNS = ['NUMERODO', 'CODMUNOCOR', 'DTOBITO', 'CAUSABAS', 'IDADE', 'SEXO', 'LINHAA', 'LINHAB']
+CAUSAS = ['CAUSABAS', 'LINHAA', 'LINHAB']
+PNEU_VIRAL = ['J09', 'J090', 'J100', 'J108', 'J110', 'J111', 'J118', 'J120', 'J121', 'J122', 'J128', 'J129', 'J171']
 ### data sources
 BRASIL_IO_COVID19 = "https://brasil.io/dataset/covid19/caso?format=csv"
 BRASIL_IO_CART = "https://brasil.io/dataset/covid19/obito_cartorio?format=csv"
@@ -35,6 +40,25 @@ def download_SIM(ano, estado):
     download(estado, ano)
 
 
+def pysus_downloader(estado, ano):
+    '''
+    Baixa (se necessário) um ano do SIM para o cache do PySUS e o lê do cache.
+    '''
+    download_SIM(ano, estado)
+    for fi in cache_contents():
+        if f'SIM_DO{estado}{ano}' in fi:
+            return pd.read_parquet(fi, engine='pyarrow', columns=SIM_COLUMNS)
+    raise FileNotFoundError(f'SIM_DO{estado}{ano} não encontrado no cache do PySUS')
+
+
+def parquet_downloader(directory, estado, ano):
+    '''
+    Lê um ano do SIM de `directory/SIM_DO{estado}{ano}.parquet`. Use com
+    functools.partial para testar a construção dos baselines com arquivos locais.
+    '''
+    return pd.read_parquet(os.path.join(directory, f'SIM_DO{estado}{ano}.parquet'), columns=SIM_COLUMNS)
+
+
 def get_data_from_cart(source, usecols=None, rename_cols=None):
     df = pd.read_csv(source, usecols=usecols)
     if rename_cols:
@@ -70,24 +94,68 @@ def converte_datas(df):
     return df
 
 
+DIAS_POR_UNIDADE = {'0': 1 / 1440., '1': 1 / 24., '2': 1., '3': 30., '4': 365., '5': 365.}
+FATOR_UNIDADE = {'Y': 365., 'M': 30., 'D': 1., 'H': 1 / 24., 'm': 1 / 1440.}
+
+
+def decodifica_idade_vetorizado(idade, unidade='D'):
+    '''
+    Versão vetorizada de decodifica_idade_SIM: o primeiro dígito do código é a unidade
+    (minutos, horas, dias, meses, anos, mais de 100 anos) e os demais, o valor.
+    Códigos inválidos ou ignorados resultam em NaN.
+    '''
+    idade = pd.Series(idade).astype(str)
+    valor = pd.to_numeric(idade.str[1:], errors='coerce')
+    codigo = idade.str[0]
+    valor = valor.where(codigo != '5', valor + 100)
+    return valor * codigo.map(DIAS_POR_UNIDADE) / FATOR_UNIDADE[unidade]
+
+
+def prepara_SIM(df):
+    df = converte_datas(df)
+    df['idade'] = decodifica_idade_vetorizado(df.IDADE).values
+    df.set_index('DTOBITO', inplace=True)
+    return codifica_causas(df)
+
+
+def codifica_causas(df):
+    '''
+    Codifica as colunas de causas (CID) como categóricas. Os filtros passam a ser
+    avaliados sobre as categorias distintas e não sobre cada óbito.
+    '''
+    for col in CAUSAS:
+        if df[col].dtype.name != 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+def mascara_causas(df, seleciona):
+    '''
+    Óbitos em que alguma das colunas de causas satisfaz `seleciona`, função que recebe
+    as categorias de uma coluna e retorna um array booleano.
+    '''
+    mask = np.zeros(len(df), dtype=bool)
+    for col in CAUSAS:
+        causas = df[col].cat
+        selecionadas = np.append(np.asarray(seleciona(causas.categories.astype(str))), False)
+        mask |= selecionadas[causas.codes]  # código -1 (ausente) cai no False final
+    return mask
+
+
 def load_anos(estado):
     '''
     Lê dados do SIM diretamente do Cache.
     Todos os anos disponíveis para o Estado
     '''
-    cols2read = ['NUMERODO', 'CODMUNOCOR', 'DTOBITO', 'CAUSABAS', 'IDADE', 'SEXO', 'LINHAA', 'LINHAB']
     anos = []
     for fi in cache_contents():
         if (f'SIM_DO{estado}' in fi):
             print("Loading ", fi)
-            df = pd.read_parquet(fi, engine='pyarrow', columns=cols2read)
-            df = converte_datas(df)
-            df['idade'] = df.IDADE.apply(lambda x: decodifica_idade_SIM(x))
-            df.set_index('DTOBITO', inplace=True)
-            anos.append(df)
+            df = pd.read_parquet(fi, engine='pyarrow', columns=SIM_COLUMNS)
+            anos.append(prepara_SIM(df))
     #     print(meses)
     ddf = pd.concat(anos)
-    return ddf
+    return codifica_causas(ddf)
 
 
 def plot_obitos_covid(estado, cases):
@@ -105,7 +173,7 @@ def filtra_obitos_covid(cases, estado):
     obitos.set_index('data', inplace=True)
     obitos.sort_index(inplace=True)
     obitos['incidencia'] = obitos.deaths.diff()
-    obitos['ew'] = [int(episem.episem(x, out='W')) for x in obitos.index]
+    obitos['ew'] = episem.episem_array(obitos.index)[1]
     return obitos
 
 
@@ -118,33 +186,119 @@ def plot_serie_SIM(estado):
 
 def filtra_obitos_SIM(estado, only_viral=True):
     df = load_anos(estado)
+    return seleciona_obitos_SIM(df, only_viral)
+
+
+def seleciona_obitos_SIM(df, only_viral=True):
+    df = codifica_causas(df)
     if only_viral:
-        pneu = ['J09', 'J090', 'J100', 'J108', 'J110', 'J111', 'J118', 'J120', 'J121', 'J122', 'J128', 'J129', 'J171']
+        pneu = PNEU_VIRAL
     else:
-        pneu = set([cid for cid in df.CAUSABAS if cid.startswith('J1')]+['J09', 'J090'])
-    pneu_obitos = df[df.CAUSABAS.isin(pneu) | df.LINHAA.isin(pneu) | df.LINHAB.isin(pneu)]
+        causabas = df.CAUSABAS.cat
+        presentes = causabas.categories[np.unique(causabas.codes[causabas.codes >= 0])].astype(str)
+        pneu = presentes[presentes.str.startswith('J1')].union(['J09', 'J090'])
+    pneu_obitos = df[mascara_causas(df, lambda causas: causas.isin(pneu))]
     return pneu_obitos
 
+
 def df_baseline_estado(estado, viral=True):
     pneu_obitos = filtra_obitos_SIM(estado, only_viral=viral)
-    avg = pneu_obitos.resample('W').count()
-    avg['week'] = avg.index.week
-    median = avg.groupby('week').median()
-    new_df = median.drop(['CODMUNOCOR','IDADE','SEXO','LINHAA','LINHAB','idade'], axis=1)
-    new_df = new_df.rename(columns={"CAUSABAS": "median"})
-    new_df['perc_75'] = avg.groupby('week').agg(lambda x: np.percentile(x, 75)).CAUSABAS
-    new_df['perc_25'] = avg.groupby('week').agg(lambda x: np.percentile(x, 25)).CAUSABAS
-    return new_df
+    return baseline_semanal(pneu_obitos)
+
+
+def baseline_semanal(pneu_obitos, percentis=(75, 25)):
+    '''
+    Mediana e percentis, por semana do ano, do número semanal de óbitos.
+    Todos os percentis são calculados numa única passada sobre uma matriz
+    (semana × ano).
+    '''
+    semanal = pneu_obitos.CAUSABAS.resample('W').count()
+    colunas = ['median'] + [f'perc_{p}' for p in percentis]
+    if semanal.empty:
+        return pd.DataFrame(columns=colunas, index=pd.Index([], name='week'))
+    week = np.asarray(semanal.index.week)
+    ocorrencia = semanal.groupby(week).cumcount().values
+    semanas = np.unique(week)
+    matriz = np.full((len(semanas), ocorrencia.max() + 1), np.nan)
+    matriz[np.searchsorted(semanas, week), ocorrencia] = semanal.values
+    valores = np.nanpercentile(matriz, [50] + list(percentis), axis=1).T
+    return pd.DataFrame(valores, index=pd.Index(semanas, name='week'), columns=colunas)
+
+
+def candidatos_respiratorios(df):
+    '''
+    Óbitos que podem entrar em algum dos baselines (viral ou todas as respiratórias):
+    algum dos códigos começa com J1 ou é J09/J090.
+    '''
+    df = codifica_causas(df)
+    return df[mascara_causas(df, lambda causas: causas.str.startswith('J1') | causas.isin(['J09', 'J090']))]
+
+
+def checkpoint_path(checkpoint_dir, estado, ano):
+    return os.path.join(checkpoint_dir, f'SIM_{estado}_{ano}.parquet')
+
+
+def processa_ano(estado, ano, checkpoint_dir, downloader=pysus_downloader):
+    '''
+    Tarefa do pool: baixa um ano do SIM de um estado, decodifica e guarda apenas os
+    óbitos respiratórios num checkpoint. Tarefas já concluídas não são refeitas.
+    '''
+    path = checkpoint_path(checkpoint_dir, estado, ano)
+    if os.path.exists(path):
+        return path
+    df = candidatos_respiratorios(prepara_SIM(downloader(estado, ano)))
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    df.to_parquet(tmp_path, engine='pyarrow')
+    os.replace(tmp_path, path)
+    return path
+
+
+def baselines_estado(estado, anos, checkpoint_dir):
+    '''
+    Baselines viral e de todas as respiratórias numa única passada pelos checkpoints.
+    '''
+    df = codifica_causas(pd.concat([pd.read_parquet(checkpoint_path(checkpoint_dir, estado, ano), engine='pyarrow')
+                                    for ano in anos]))
+    return (baseline_semanal(seleciona_obitos_SIM(df, only_viral=True)),
+            baseline_semanal(seleciona_obitos_SIM(df, only_viral=False)))
+
+
+def baseline_paths(out_dir, estado):
+    return (os.path.join(out_dir, f'baseline_{estado}.csv.gz'),
+            os.path.join(out_dir, f'baseline_{estado}_all_resp.csv.gz'))
+
+
+def build_baselines(estados, anos=YEARS, out_dir='baseline', workers=None, downloader=pysus_downloader):
+    '''
+    Constrói os baselines de todos os estados com um pool de processos sobre os pares
+    (estado, ano). Cada par concluído deixa um checkpoint em `out_dir/checkpoints`, de
+    modo que uma execução interrompida continua de onde parou.
+
+    :param downloader: função (estado, ano) -> DataFrame com as colunas SIM_COLUMNS
+    '''
+    checkpoint_dir = os.path.join(out_dir, 'checkpoints')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    pendentes = [est for est in estados
+                 if not all(os.path.exists(p) for p in baseline_paths(out_dir, est))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(processa_ano, est, ano, checkpoint_dir, downloader): (est, ano)
+                   for est in pendentes for ano in anos}
+        for future in as_completed(futures):
+            est, ano = futures[future]
+            future.result()
+            logger.info("%s %s pronto", est, ano)
+    for est in pendentes:
+        viral, all_resp = baselines_estado(est, anos, checkpoint_dir)
+        viral_path, all_resp_path = baseline_paths(out_dir, est)
+        viral.to_csv(viral_path)
+        all_resp.to_csv(all_resp_path)
+    return pendentes
 
 def plot_baseline_estado(estado):
-    pneu_obitos = filtra_obitos_SIM(estado)
-    avg = pneu_obitos.resample('W').count()
-    avg['week'] = avg.index.week
-    ax = avg.groupby('week').median().CAUSABAS.plot(style='-o', figsize=(20, 5), grid=True, label='Median')
-    avg.groupby('week').agg(lambda x: np.percentile(x, 75)).CAUSABAS.plot(ax=ax, style=':', figsize=(20, 5), grid=True,
-                                                                          label='75%')
-    avg.groupby('week').agg(lambda x: np.percentile(x, 25)).CAUSABAS.plot(ax=ax, style=':', figsize=(20, 5), grid=True,
-                                                                          label='25%')
+    base = baseline_semanal(filtra_obitos_SIM(estado))
+    ax = base['median'].plot(style='-o', figsize=(20, 5), grid=True, label='Median')
+    base.perc_75.plot(ax=ax, style=':', figsize=(20, 5), grid=True, label='75%')
+    base.perc_25.plot(ax=ax, style=':', figsize=(20, 5), grid=True, label='25%')
     obitos = filtra_obitos_covid(data_covid, estado)
     obitos.groupby('ew').sum().incidencia.iloc[:-1].plot(ax=ax, style='r:+', figsize=(20, 8), grid=True, logy=False);
     ax.set_title(f'Esperado Histórico para {estado}')
@@ -153,26 +307,12 @@ def plot_baseline_estado(estado):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     data_covid = fetch_brasilio_data()
     estados = set(data_covid.state)
-    viral = False
     ## Preenchendo o Cache
-    ## Rode apenas uma vez
-    if not os.path.exists('baseline'):
-        os.makedirs('baseline')
-
-    for est in estados:
-        if os.path.exists(f'baseline/baseline_{est}.csv'):
-            continue
-        print(f"Baixando {est}...")
-        for ano in YEARS:
-            download_SIM(ano, est)
-        base = df_baseline_estado(est, viral=viral)
-        if viral:
-            base.to_csv(f'baseline/baseline_{est}.csv.gz')  
-        else:
-            base.to_csv(f'baseline/baseline_{est}_all_resp.csv.gz')
-        # ~ plot_obitos_covid(est, data_covid)  
+    ## Pode ser interrompido e executado novamente: continua de onde parou
+    build_baselines(estados, YEARS, out_dir='baseline')
         
     excesso = pd.DataFrame(columns=['estado','mediana_historica', 'covid','diferença'])
 
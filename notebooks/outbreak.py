@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import tracemalloc
 import networkx as nx
 import pandas as pd
 import numpy as np
@@ -7,6 +11,7 @@ import dask.array as da
 import geopandas as gpd
 import contextily as ctx
 from scipy.special import lambertw
+from scipy import sparse
 import pylab as P
 
 
@@ -19,6 +24,56 @@ def read_flow_matrix(fname, header=0):
     return df.values
 
 
+def convert_flow_matrix(fname, outdir, header=0, chunksize=500):
+    """
+    One-time conversion of the CSV flow matrix to a compact CSR format: one .npy file
+    each for data, indices, indptr and the geocodes from the header, which can be
+    memory-mapped by read_sparse_flow_matrix. The CSV is read in row chunks, so the
+    dense matrix is never materialized.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    blocks = []
+    geocodes = None
+    for chunk in pd.read_csv(fname, header=header, chunksize=chunksize, dtype=np.float64):
+        if geocodes is None:
+            geocodes = chunk.columns.values
+        blocks.append(sparse.csr_matrix(chunk.values))
+    flowmat = sparse.vstack(blocks, format='csr')
+    flowmat.sort_indices()
+    np.save(os.path.join(outdir, 'data.npy'), flowmat.data)
+    # Same index dtype for both arrays: otherwise csr_matrix casts them to a common
+    # dtype on load, copying them out of the memory map. int32 fits 5565**2 entries.
+    np.save(os.path.join(outdir, 'indices.npy'), flowmat.indices.astype(np.int32))
+    np.save(os.path.join(outdir, 'indptr.npy'), flowmat.indptr.astype(np.int32))
+    if header is not None:
+        np.save(os.path.join(outdir, 'geocodes.npy'), geocodes.astype(np.int64))
+    return flowmat
+
+
+def read_sparse_flow_matrix(dirname, mmap=True):
+    """
+    Read the CSR flow matrix written by convert_flow_matrix. With mmap=True the arrays
+    are memory-mapped read-only and shared between processes.
+    """
+    mode = 'r' if mmap else None
+    data = np.load(os.path.join(dirname, 'data.npy'), mmap_mode=mode)
+    indices = np.load(os.path.join(dirname, 'indices.npy'), mmap_mode=mode)
+    indptr = np.load(os.path.join(dirname, 'indptr.npy'), mmap_mode=mode)
+    n = len(indptr) - 1
+    return sparse.csr_matrix((data, indices, indptr), shape=(n, n), copy=False)
+
+
+def is_memory_mapped(array):
+    """
+    True if array is a view of a memory-mapped file, i.e. it was not copied on load.
+    """
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
 def read_nodes(fname):
     '''
     Reads csv with MR names geocodes, populations and Incidences
@@ -63,8 +118,10 @@ def get_outbreaks(flowmat, incidence, R0=2.5, asymf=10, attenuate=1.0):
     :return:
     """
     # Adjusting arrivals by incidence
+    # flowmat.T is a view (a CSC view for sparse matrices), and attenuate is applied
+    # to the resulting vector, so the matrix is never copied
 
-    inflows = (flowmat.T * attenuate) @ incidence
+    inflows = (flowmat.T @ np.asarray(incidence)) * attenuate
 
     probs = 1 - (1 / R0) ** (inflows * 8 * asymf)
 
@@ -109,7 +166,49 @@ def plot_ranking(nodes, probs, figsize=(10, 10), namefield='nome'):
     return ranking
 
 
+def benchmark_flow_matrix(fname, dirname, header=0, repeat=10):
+    '''
+    Compares load time, peak memory and mat-vec time of the dense CSV path
+    with the memory-mapped sparse path. Checks that the sparse arrays are still
+    views of the memory map and that both paths give the same outbreak probabilities.
+    '''
+    results = {}
+    probs = {}
+    incidence = None
+    for name, load in [('dense_csv', lambda: read_flow_matrix(fname, header=header)),
+                       ('sparse_mmap', lambda: read_sparse_flow_matrix(dirname))]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        flowmat = load()
+        load_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if incidence is None:
+            incidence = np.random.default_rng(0).random(flowmat.shape[0]) * 1e-3
+        start = time.perf_counter()
+        for _ in range(repeat):
+            probs[name] = get_outbreaks(flowmat, incidence, attenuate=0.5)
+        results[name] = {
+            'load_s': load_time,
+            'peak_mb': peak / 2 ** 20,
+            'matvec_s': (time.perf_counter() - start) / repeat,
+        }
+    sparse_mat = read_sparse_flow_matrix(dirname)
+    results['sparse_mmap']['zero_copy'] = all(
+        is_memory_mapped(a) for a in (sparse_mat.data, sparse_mat.indices, sparse_mat.indptr))
+    results['same_probs'] = bool(np.allclose(probs['dense_csv'], probs['sparse_mmap']))
+    return results
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'convert':
+        # python outbreak.py convert ../dados/flowmatrix_full_mun.csv.gz ../dados/flowmatrix_full_mun
+        convert_flow_matrix(sys.argv[2], sys.argv[3])
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        # python outbreak.py benchmark ../dados/flowmatrix_full_mun.csv.gz ../dados/flowmatrix_full_mun
+        print(benchmark_flow_matrix(sys.argv[2], sys.argv[3]))
+        sys.exit()
     F = read_flow_matrix('flowmatrix_full.csv', header=None)
     nodes = read_nodes('../Dados/nodes.csv')
     mapa = gpd.read_file('microreg.gpkg')
@@ -0,0 +1,59 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import episem
+
+YEARS = range(1950, 2050)
+
+
+def scalar(dates):
+    """
+    (epiyear, epiweek) de cada data pela versão escalar.
+    """
+    result = [episem.episem(d, out="YW") for d in pd.DatetimeIndex(dates).to_pydatetime()]
+    return np.array([int(r[:4]) for r in result]), np.array([int(r[5:]) for r in result])
+
+
+def assert_same(dates, result):
+    epiyear, epiweek = scalar(dates)
+    np.testing.assert_array_equal(result[0], epiyear)
+    np.testing.assert_array_equal(result[1], epiweek)
+
+
+def test_random_dates():
+    rng = np.random.default_rng(0)
+    start, end = np.datetime64("1950-01-01"), np.datetime64("2049-12-31")
+    days = rng.integers(0, (end - start).astype(int) + 1, size=5000)
+    dates = start + days.astype("timedelta64[D]")
+    assert_same(dates, episem.episem_array(dates))
+
+
+def test_year_boundaries():
+    # Primeiro e último dias epidemiológicos de cada ano, os vizinhos e as viradas do ano civil
+    days = []
+    for year in YEARS:
+        for day in [episem.firstepiday(year), episem.lastepiday(year),
+                    datetime.datetime(year, 1, 1), datetime.datetime(year, 12, 31)]:
+            days.extend(day + datetime.timedelta(days=k) for k in (-1, 0, 1))
+    dates = pd.DatetimeIndex(days)
+    dates = dates[(dates.year >= YEARS[0]) & (dates.year <= YEARS[-1])]
+    assert_same(dates, episem.episem_array(dates))
+
+
+@pytest.mark.parametrize("convert", [
+    lambda dates: pd.Series(dates),
+    lambda dates: pd.DatetimeIndex(dates),
+    lambda dates: dates.to_numpy().astype("datetime64[D]"),
+    lambda dates: dates.to_numpy().astype("datetime64[ns]"),
+], ids=["series", "datetimeindex", "datetime64[D]", "datetime64[ns]"])
+def test_input_types(convert):
+    dates = pd.date_range("2019-12-25", "2021-01-10", freq="D")
+    assert_same(dates, episem.episem_array(convert(dates)))
+
+
+def test_out_of_range():
+    with pytest.raises(ValueError):
+        episem.episem_array(np.array(["1850-06-01"], dtype="datetime64[D]"))
@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import fetch
+
+CSV = "".join(f"{i},{i * i}\n" for i in range(20000)).encode()
+BODY = gzip.compress(CSV)
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", "Tue, 01 Sep 2020 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/caso_full.csv.gz"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def read_csv(stream):
+    return pd.read_csv(stream, header=None, names=["a", "b"])
+
+
+def test_gzip_streamed_into_parser(server):
+    seen = []
+
+    def parse(stream):
+        # O parser recebe o corpo já descomprimido, como arquivo
+        seen.append(stream.read(10))
+        return read_csv(io.BytesIO(seen[0] + stream.read()))
+
+    result = fetch.fetch(server, parse)
+    assert result.status == 200
+    assert seen[0] == CSV[:10]
+    assert len(result.data) == 20000 and result.data["b"].iloc[-1] == 19999 ** 2
+    assert result.bytes_transferred == len(BODY)
+    assert result.digest == hashlib.sha1(BODY).hexdigest()
+    assert result.version == ETAG
+    assert fetch.stats[server]["bytes_transferred"] == len(BODY)
+
+
+def test_not_modified_skips_parse(server):
+    first = fetch.fetch(server, read_csv)
+    meta = first.as_meta()
+
+    def parse(stream):
+        raise AssertionError("o parser não deve ser chamado numa resposta 304")
+
+    result = fetch.fetch(server, parse, validators=meta)
+    assert Handler.requests[-1]["If-None-Match"] == ETAG
+    assert Handler.requests[-1]["If-Modified-Since"] == meta["last_modified"]
+    assert result.not_modified and result.data is None
+    assert result.bytes_transferred == 0
+    assert result.etag == ETAG and result.digest == first.digest
+    assert result.version == first.version
+
+
+def test_stand_in_transport():
+    calls = []
+
+    def transport(url, headers):
+        calls.append((url, headers))
+        return 200, {}, io.BytesIO(CSV)
+
+    fetch.set_transport(transport)
+    try:
+        result = fetch.fetch("http://example.org/dados.csv", read_csv)
+    finally:
+        fetch.set_transport(fetch.urllib_transport)
+    assert calls[0][0] == "http://example.org/dados.csv"
+    assert "If-None-Match" not in calls[0][1]
+    assert result.bytes_transferred == len(CSV)
+    # Sem ETag, a versão é o digest do conteúdo
+    assert result.version == hashlib.sha1(CSV).hexdigest()
+    assert len(result.data) == 20000